@@ -0,0 +1 @@
+""" Benchmarks and synthetic data sets for the csv readers """
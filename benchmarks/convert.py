@@ -0,0 +1,93 @@
+"""
+Benchmark of cell conversion on the default weather schema.
+
+Compares the per-cell Type.check/Type.convert path, which compiled each regex
+on every call, against the row converter built by csvReader2.compile_converter,
+with and without memoizing the conversions of the yyyy, mm and af fields.
+
+run from the repository root with:  python benchmarks/convert.py [rows]
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from csvReader import csvReader2 as csv2
+
+
+def make_rows(count, seed=0):
+    """build 'count' rows of weather data as lists of strings, with some empty and unreadable cells"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        row = [str(1900 + i // 12), str(i % 12 + 1),
+               "{:.1f}".format(rng.uniform(-5, 30)), "{:.1f}".format(rng.uniform(-10, 20)),
+               str(rng.randint(0, 31)), "{:.1f}".format(rng.uniform(0, 200)), "{:.1f}".format(rng.uniform(0, 300))]
+        if rng.random() < 0.05:
+            row[rng.randrange(2, 7)] = ""
+        if rng.random() < 0.02:
+            row[rng.randrange(2, 7)] = "---"
+        rows.append(row)
+    return rows
+
+
+def legacy_convert_row(row, fields, empty_cell, null_count, error_count):
+    """the conversion performed for each row before compile_converter was introduced"""
+    def check(type, string):
+        if type.regex is not None:
+            return bool(re.compile(type.regex).match(string))
+        return True
+
+    def convert(type, string):
+        if check(type, string):
+            return type.output_type(string)
+        raise ValueError(string)
+
+    converted = [None]*len(fields)
+    for j in range(len(fields)):
+        if not check(fields[j].type, row[j]):
+            if empty_cell.match(row[j]):
+                null_count[j] += 1
+            else:
+                error_count[j] += 1
+        else:
+            converted[j] = convert(fields[j].type, row[j])
+    return converted
+
+
+def time_it(function, rows):
+    start = time.perf_counter()
+    for row in rows:
+        function(row)
+    return time.perf_counter() - start
+
+
+def main(count=200000):
+    rows = make_rows(count)
+    csv_file = csv2.CsvFile()
+    metadata, fields = csv_file.metadata, csv_file.fields
+    cells = count * len(fields)
+    null_count, error_count = [0]*len(fields), [0]*len(fields)
+
+    legacy = time_it(lambda row: legacy_convert_row(row, fields, metadata.empty_cell, null_count, error_count), rows)
+    convert_row = csv2.compile_converter(fields, metadata)
+    compiled = time_it(lambda row: convert_row(row, null_count, error_count), rows)
+    caches = csv2.conversion_caches(["yyyy", "mm", "af"])
+    memoized_row = csv2.compile_converter(fields, metadata, caches=caches)
+    memoized = time_it(lambda row: memoized_row(row, null_count, error_count), rows)
+
+    print("cells converted: {}".format(cells))
+    print("per-cell Type.check/convert: {:>12,.0f} cells/sec".format(cells / legacy))
+    print("compiled row converter:      {:>12,.0f} cells/sec".format(cells / compiled))
+    print("memoized yyyy, mm and af:    {:>12,.0f} cells/sec".format(cells / memoized))
+    print("speed up: {:.2f}x, memoized {:.2f}x".format(legacy / compiled, legacy / memoized))
+    for name, cache in caches.items():
+        print("{} cache hit rate: {:.1%}".format(name, cache.hits / (cache.hits + cache.misses)))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
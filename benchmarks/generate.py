@@ -0,0 +1,70 @@
+"""
+Generators for synthetic weather files in the Met Office station data layout
+(the default csvReader2 schema: yyyy, mm, tmax, tmin, af, rain, sun)
+
+run from the repository root with:  python -m benchmarks.generate rows path
+"""
+
+import argparse
+import random
+
+HEADINGS = ["yyyy", "mm", "tmax", "tmin", "af", "rain", "sun"]
+UNITS = ["", "", "degC", "degC", "days", "mm", "hours"]
+
+
+def weather_rows(rows, null_rate=0.02, error_rate=0.005, marker_rate=0.05, seed=0):
+    """
+    generator yielding the cells of 'rows' rows of monthly weather data as lists of strings
+    :param null_rate: the probability of a measurement cell being left empty
+    :param error_rate: the probability of a measurement cell holding unreadable text ("---")
+    :param marker_rate: the probability of a measurement cell being followed by a "*" or "#" marker
+    :param seed: the seed for the random number generator, so data sets can be reproduced
+    """
+    rng = random.Random(seed)
+    for i in range(rows):
+        cells = [str(1853 + i // 12), str(i % 12 + 1),
+                 "{:.1f}".format(rng.uniform(-5, 30)), "{:.1f}".format(rng.uniform(-10, 20)),
+                 str(rng.randint(0, 31)), "{:.1f}".format(rng.uniform(0, 200)), "{:.1f}".format(rng.uniform(0, 300))]
+        for j in range(2, 7):
+            chance = rng.random()
+            if chance < null_rate:
+                cells[j] = ""
+            elif chance < null_rate + error_rate:
+                cells[j] = "---"
+            elif chance < null_rate + error_rate + marker_rate:
+                cells[j] += rng.choice("*#")
+        yield cells
+
+
+def write_weather_file(path, rows, units=False, **kwargs):
+    """
+    writes a synthetic weather file with a heading row (and optionally a unit row) to path,
+    the keyword arguments are passed to weather_rows
+    :return: the number of bytes written
+    """
+    with open(path, "w") as data_file:
+        data_file.write(", ".join(HEADINGS) + "\n")
+        if units:
+            data_file.write(", ".join(UNITS) + "\n")
+        for cells in weather_rows(rows, **kwargs):
+            data_file.write(", ".join(cells) + "\n")
+        return data_file.tell()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="write a synthetic weather csv file")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--null-rate", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.005)
+    parser.add_argument("--marker-rate", type=float, default=0.05)
+    parser.add_argument("--units", action="store_true", help="add a row of units under the headings")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    size = write_weather_file(args.path, args.rows, units=args.units, null_rate=args.null_rate,
+                              error_rate=args.error_rate, marker_rate=args.marker_rate, seed=args.seed)
+    print("wrote {} rows ({} bytes) to {}".format(args.rows, size, args.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Benchmarks of the csvReader and csvReader2 modules, and of the stdlib csv module as a baseline,
+reading synthetic weather files of increasing size.
+
+For each engine and file size the throughput, the peak memory allocated (measured in a separate run
+with tracemalloc) and the time spent in each stage of the pipeline are recorded; results are written
+as JSON so they can be compared between versions.
+
+run from the repository root with:  python -m benchmarks.run --rows 1000 100000 --output results.json
+"""
+
+import argparse
+import csv as stdlib_csv
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from csvReader import csvReader as csv1
+from csvReader import csvReader2 as csv2
+from benchmarks.generate import write_weather_file
+
+
+class Stages:
+    """records the time taken by each named stage of a read"""
+    def __init__(self):
+        self.times = OrderedDict()
+
+    def run(self, name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+        return result
+
+
+def read_csvreader(path, stages):
+    settings = csv1.FileSettings(labels=csv1.Labels(heading_row=0, data_row=1))
+    text = stages.run("open", csv1.open_file, path)
+    text = stages.run("remove_markers", csv1.remove_markers, text)
+    data, rows = stages.run("split_strip", csv1.split_strip, text, settings.delimiters)
+    stages.run("check_headings", csv1.check_headings, data, settings.labels)
+    data, null_count, error_count = stages.run("check_type", csv1.check_type, data, settings, rows)
+    return stages.run("trim", csv1.trim, data, settings.labels)
+
+
+def make_csv_file(path):
+    return csv2.CsvFile(metadata=csv2.MetaData(markers="*#"), filepath=path)
+
+
+def read_csvreader2(path, stages):
+    csv_file = make_csv_file(path)
+    text = stages.run("open", csv_file._open_file)
+    text = stages.run("remove_markers", csv_file._remove_markers, text)
+    data, rows = stages.run("split_strip", csv_file._split_strip, text)
+    stages.run("check_headings", csv_file._check_headings, data)
+    data = stages.run("check_type", csv_file._check_type, data, rows)
+    return stages.run("trim", csv_file._trim, data)
+
+
+def read_csvreader2_iter_rows(path, stages):
+    return stages.run("iter_rows", lambda: list(make_csv_file(path).iter_rows()))
+
+
+def read_csvreader2_columns(path, stages):
+    return stages.run("read_columns", make_csv_file(path).read_columns)
+
+
+def read_csvreader2_records(path, stages):
+    csv_file = csv2.CsvFile(metadata=csv2.MetaData(markers="*#"), filepath=path, records=True)
+    stages.run("read_file", csv_file.read_file)
+    return csv_file.data
+
+
+def read_csvreader2_mmap(path, stages):
+    csv_file = make_csv_file(path)
+    stages.run("read_file", csv_file.read_file, True)
+    return csv_file.data
+
+
+def read_csvreader2_parallel(path, stages):
+    csv_file = make_csv_file(path)
+    stages.run("read_file", lambda: csv_file.read_file(workers=0))
+    return csv_file.data
+
+
+def read_stdlib(path, stages):
+    """the stdlib csv reader, converting cells with int and float and treating failures as None"""
+    def tokenize():
+        with open(path, newline="") as data_file:
+            return list(stdlib_csv.reader(data_file, skipinitialspace=True))
+
+    def convert(rows):
+        types = [int, int, float, float, int, float, float]
+        data = []
+        for row in rows[1:]:
+            converted = []
+            for cast, cell in zip(types, row):
+                try:
+                    converted.append(cast(cell.rstrip("*#")))
+                except ValueError:
+                    converted.append(None)
+            data.append(converted)
+        return data
+
+    return stages.run("convert", convert, stages.run("tokenize", tokenize))
+
+
+ENGINES = OrderedDict([
+    ("csvReader", read_csvreader),
+    ("csvReader2", read_csvreader2),
+    ("csvReader2.iter_rows", read_csvreader2_iter_rows),
+    ("csvReader2.read_columns", read_csvreader2_columns),
+    ("csvReader2.records", read_csvreader2_records),
+    ("csvReader2.mmap", read_csvreader2_mmap),
+    ("csvReader2.parallel", read_csvreader2_parallel),
+    ("stdlib_csv", read_stdlib),
+])
+UNTRACEABLE = {"csvReader2.parallel"}  # tracemalloc cannot see the memory of worker processes
+
+
+def measure(engine, path, repeat, memory):
+    """
+    reads the file 'repeat' times with the engine, keeping the stage times of the fastest run,
+    then (if memory is true) once more under tracemalloc to find the peak memory allocated
+    """
+    read = ENGINES[engine]
+    best = None
+    for _ in range(repeat):
+        stages = Stages()
+        start = time.perf_counter()
+        read(path, stages)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best[0]:
+            best = (seconds, stages.times)
+    peak = None
+    if memory and engine not in UNTRACEABLE:
+        tracemalloc.start()
+        read(path, Stages())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best[0], best[1], peak
+
+
+def run(rows_list, engines, repeat=3, memory=True, **generate_args):
+    """
+    runs the benchmarks for each number of rows and each engine
+    :return: a list of dictionaries, one per engine and file size
+    """
+    directory = tempfile.mkdtemp()
+    results = []
+    try:
+        for rows in rows_list:
+            path = os.path.join(directory, "weather_{}.csv".format(rows))
+            size = write_weather_file(path, rows, **generate_args)
+            for engine in engines:
+                seconds, stages, peak = measure(engine, path, repeat, memory)
+                results.append(OrderedDict([
+                    ("engine", engine), ("rows", rows), ("bytes", size), ("seconds", seconds),
+                    ("rows_per_sec", rows / seconds), ("mb_per_sec", size / seconds / 1e6),
+                    ("peak_bytes", peak), ("stages", stages),
+                ]))
+                print("{:<24} {:>10} rows {:>10.3f}s {:>12,.0f} rows/s  peak {}".format(
+                    engine, rows, seconds, rows / seconds, "-" if peak is None else "{:,} B".format(peak)),
+                    file=sys.stderr)
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the csv readers")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="the sizes of the files to read, from 10**3 up to 10**7 rows")
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--null-rate", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.005)
+    parser.add_argument("--marker-rate", type=float, default=0.05)
+    parser.add_argument("--output", help="file to write the JSON results to, by default they are printed")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.engines, repeat=args.repeat, memory=not args.no_memory,
+                  null_rate=args.null_rate, error_rate=args.error_rate, marker_rate=args.marker_rate)
+    report = OrderedDict([
+        ("python", platform.python_version()), ("platform", platform.platform()),
+        ("time", time.strftime("%Y-%m-%dT%H:%M:%S")), ("results", results),
+    ])
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark of writing the default weather schema.
+
+Compares CsvWriter, writing rows and columns, against the stdlib csv writer
+(which writes None as an empty cell, but does not check the cells read back).
+
+run from the repository root with:  python benchmarks/write.py [rows]
+"""
+
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from csvReader import csvReader2 as csv2
+from csvReader.writer import CsvWriter
+from benchmarks.generate import write_weather_file
+
+
+def time_it(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def write_stdlib(path, rows):
+    with open(path, "w", newline="") as data_file:
+        csv.writer(data_file).writerows(rows)
+
+
+def main(count=200000):
+    directory = tempfile.mkdtemp()
+    try:
+        source = os.path.join(directory, "source.csv")
+        output = os.path.join(directory, "output.csv")
+        write_weather_file(source, count)
+        csv_file = csv2.CsvFile(metadata=csv2.MetaData(markers="*#"), filepath=source)
+        csv_file.read_file()
+        rows = csv_file.data
+        columns = csv_file.read_columns(use_numpy=False)
+        writer = CsvWriter(csv2.MetaData(), csv_file.fields)
+
+        stdlib = time_it(lambda: write_stdlib(output, rows))
+        by_rows = time_it(lambda: writer.write(output, rows))
+        by_columns = time_it(lambda: writer.write(output, columns))
+
+        print("rows written: {}".format(len(rows)))
+        print("stdlib csv writer:  {:>12,.0f} rows/sec".format(len(rows) / stdlib))
+        print("CsvWriter, rows:    {:>12,.0f} rows/sec".format(len(rows) / by_rows))
+        print("CsvWriter, columns: {:>12,.0f} rows/sec".format(len(rows) / by_columns))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
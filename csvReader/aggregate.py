@@ -0,0 +1,163 @@
+"""
+Aggregates computed in a single streaming pass over a csv file, without holding its rows in memory,
+e.g. the mean tmax of each month, or the total rain and air frost days of each year:
+
+    groups, rejected = aggregate(csv_file, {"tmax": ("mean", "tmax"), "rain": ("sum", "rain")}, group_by="yyyy")
+    groups[1961].values["rain"]
+
+Empty and unreadable cells are left out of each aggregate, and counted separately for each aggregate
+using the same classification (the MetaData empty_cell pattern) as CsvFile.null_count and error_count.
+"""
+
+from collections import OrderedDict
+
+from .csvReader2 import BLOCK_SIZE
+from .grouping import column_indexes
+
+
+class Sum:
+    def __init__(self):
+        self.total = 0
+
+    def add(self, value):
+        self.total += value
+
+    def result(self):
+        return self.total
+
+
+class Count:
+    def __init__(self):
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+
+    def result(self):
+        return self.count
+
+
+class Mean:
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, value):
+        self.total += value
+        self.count += 1
+
+    def result(self):
+        return self.total / self.count if self.count else None
+
+
+class Min:
+    def __init__(self):
+        self.value = None
+
+    def add(self, value):
+        if self.value is None or value < self.value:
+            self.value = value
+
+    def result(self):
+        return self.value
+
+
+class Max:
+    def __init__(self):
+        self.value = None
+
+    def add(self, value):
+        if self.value is None or value > self.value:
+            self.value = value
+
+    def result(self):
+        return self.value
+
+
+AGGREGATORS = {"sum": Sum, "count": Count, "mean": Mean, "min": Min, "max": Max}
+
+
+class Group:
+    """
+    The aggregates of one group of rows: 'values' maps each aggregate name to its result,
+    'null_count' and 'error_count' map each aggregate name to the number of empty and unreadable cells
+    left out of it, and 'rows' is the number of rows in the group
+    """
+    def __init__(self, names, aggregators):
+        self.names = names
+        self.aggregators = aggregators
+        self.rows = 0
+        self.null_count = OrderedDict((name, 0) for name in names)
+        self.error_count = OrderedDict((name, 0) for name in names)
+
+    @property
+    def values(self):
+        return OrderedDict((name, aggregator.result()) for name, aggregator in zip(self.names, self.aggregators))
+
+
+def aggregate(csv_file, aggregates, group_by=None, where=None, block_size=BLOCK_SIZE):
+    """
+    Reads csv_file in a single pass, computing aggregates of its fields for each group of rows.
+
+    :param csv_file: the CsvFile to read
+    :param aggregates: a dictionary mapping the name of each aggregate to a tuple (function, field name),
+     the functions being "sum", "count", "mean", "min" and "max" (or any name added to AGGREGATORS)
+    :param group_by: the field (or tuple of fields) to group rows by, or None to aggregate all the rows together
+    :param where: a dictionary mapping field names to predicates, only rows passing them all are aggregated
+    :param block_size: the number of characters to read from the file at a time
+    :return: a tuple (groups, rejected) where groups is an OrderedDict mapping each key (a value, or a tuple
+     of values when grouping by several fields, or None when not grouping) to a Group, in the order the keys
+     are first found, and rejected is the number of rows left out as a key field was empty or unreadable
+    """
+    fields = csv_file.fields
+    names = list(aggregates)
+    plan = []
+    for name in names:
+        function, field = aggregates[name]
+        if function not in AGGREGATORS:
+            raise ValueError(str(function) + " is not a valid aggregate function")
+        plan.append((column_indexes(field, fields)[0], AGGREGATORS[function]))
+    factories = [factory for _, factory in plan]
+    columns = [(k, j) for k, (j, _) in enumerate(plan)]
+    if group_by is None:
+        key_indexes = ()
+    else:
+        key_indexes = column_indexes(group_by, fields)
+    single_key = len(key_indexes) == 1
+    empty_match = csv_file.metadata.empty_cell.match
+
+    csv_file._start_read()
+    convert_row = csv_file._converter(where)
+    null_count, error_count = csv_file.null_count, csv_file.error_count
+    groups = OrderedDict()
+    rejected = 0
+    for cells in csv_file._iter_data_rows(csv_file._iter_split_rows(block_size)):
+        row = convert_row(cells, null_count, error_count)
+        if row is None:
+            continue
+        if single_key:
+            key = row[key_indexes[0]]
+            if key is None:
+                rejected += 1
+                continue
+        elif key_indexes:
+            key = tuple(row[i] for i in key_indexes)
+            if None in key:
+                rejected += 1
+                continue
+        else:
+            key = None
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = Group(names, [factory() for factory in factories])
+        group.rows += 1
+        aggregators = group.aggregators
+        for k, j in columns:
+            value = row[j]
+            if value is not None:
+                aggregators[k].add(value)
+            elif empty_match(cells[j]):
+                group.null_count[names[k]] += 1
+            else:
+                group.error_count[names[k]] += 1
+    return groups, rejected
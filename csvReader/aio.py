@@ -0,0 +1,163 @@
+"""
+asyncio counterparts of the CsvFile reading methods, for use from async services (python 3.7 or later).
+The reading and parsing is done in an executor so the event loop is never blocked:
+
+    data = await aread_file(csv_file)
+
+    async for batch in BatchIterator(csv_file, 1000):
+        ...
+
+    results = await aread_files(csv_files, limit=8)
+"""
+
+import asyncio
+import threading
+import weakref
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError
+
+from .csvReader2 import BLOCK_SIZE, FileResult
+
+MAX_BATCHES = 2  # batches read ahead of the consumer by a BatchIterator
+POLL_INTERVAL = 0.05  # seconds a reading thread waits on a full queue before checking whether to stop
+
+
+async def aread_file(csv_file, executor=None, **kwargs):
+    """
+    reads a file as CsvFile.read_file(**kwargs) does, in an executor rather than on the event loop.
+    :param csv_file: the CsvFile to read, its data, null_count and error_count are filled in
+    :param executor: the executor to read in, by default the event loop's default thread pool.
+     With a ProcessPoolExecutor the file is parsed in another process, which keeps the parsing from competing
+     with the event loop for the GIL; the csv_file must then have no metrics, error_budget or quarantine
+    :return: the data read
+    """
+    loop = asyncio.get_running_loop()
+    if isinstance(executor, ProcessPoolExecutor):
+        if csv_file.metrics is not None or csv_file.error_budget is not None or csv_file.quarantine is not None:
+            raise ValueError("metrics, an error budget or quarantine cannot be used reading in another process")
+        result = await loop.run_in_executor(executor, _read_in_process, csv_file.schema, csv_file.filepath, kwargs)
+        csv_file.data, csv_file.null_count, csv_file.error_count = result.data, result.null_count, result.error_count
+    else:
+        await loop.run_in_executor(executor, lambda: csv_file.read_file(**kwargs))
+    return csv_file.data
+
+
+async def aread_files(csv_files, limit=4, executor=None, **kwargs):
+    """
+    reads many files concurrently, with at most 'limit' reads in progress at a time.
+    A file which cannot be read does not stop the others, its error is kept in its result instead.
+    :param csv_files: a list of CsvFile objects
+    :param limit: the maximum number of files read at once
+    :param executor: the executor to read in (see aread_file)
+    :return: a list of a FileResult for each file, in the order given
+    """
+    if limit < 1:
+        raise ValueError("the concurrency limit must be at least 1")
+    semaphore = asyncio.Semaphore(limit)
+
+    async def read_one(csv_file):
+        async with semaphore:
+            try:
+                await aread_file(csv_file, executor, **kwargs)
+            except Exception as error:
+                return FileResult(error=error)
+        return FileResult(csv_file.data, csv_file.null_count, csv_file.error_count)
+
+    return await asyncio.gather(*[read_one(csv_file) for csv_file in csv_files])
+
+
+class BatchIterator:
+    """
+    Asynchronous iterator over the batches of converted rows of a file, as given by CsvFile.iter_batches.
+    The file is read in a thread of 'executor', which stays at most 'max_batches' batches ahead of the
+    consumer, so a slow consumer holds back the reading rather than letting batches pile up in memory.
+    The reading thread stops when aclose() is awaited or, if iteration is abandoned early (as by a break out
+    of an async for loop), once the iterator is no longer referenced
+    """
+    def __init__(self, csv_file, size, max_batches=MAX_BATCHES, executor=None, block_size=BLOCK_SIZE, where=None):
+        if max_batches < 1:
+            raise ValueError("max_batches must be at least 1")
+        if isinstance(executor, ProcessPoolExecutor):
+            raise ValueError("batches can only be read in a thread executor")
+        self.csv_file = csv_file
+        self.size = size
+        self.max_batches = max_batches
+        self.executor = executor
+        self.block_size = block_size
+        self.where = where
+        self._queue = None
+        self._reader = None
+        self._closed = False
+        self._stop = threading.Event()
+        weakref.finalize(self, self._stop.set)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._queue is None:
+            if self._closed:
+                raise StopAsyncIteration
+            loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue(self.max_batches)
+            self._reader = loop.run_in_executor(self.executor, _read_batches, self.csv_file, self.size,
+                                                self.block_size, self.where, self._queue, loop, self._stop)
+        item = await self._queue.get()
+        if item is _END:
+            self._closed = True
+            await self._reader
+            raise StopAsyncIteration
+        if isinstance(item, _Failure):
+            self._closed = True
+            await self._reader
+            raise item.error
+        return item
+
+    async def aclose(self):
+        """stops reading the file, waiting for the reading thread to finish"""
+        self._closed = True
+        self._stop.set()
+        if self._reader is not None:
+            await self._reader
+
+
+def _read_batches(csv_file, size, block_size, where, queue, loop, stop):
+    """
+    runs in the executor for a BatchIterator, putting each batch (then _END) in its queue. While the queue is full
+    it checks every POLL_INTERVAL whether 'stop' is set, and if so returns. It is given no reference to the
+    BatchIterator itself, so an abandoned iterator can be collected and set 'stop'
+    """
+    def put(item):
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(POLL_INTERVAL)
+                return True
+            except TimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+            except CancelledError:
+                return False
+
+    try:
+        for batch in csv_file.iter_batches(size, block_size, where):
+            if stop.is_set() or not put(batch):
+                return
+    except Exception as error:
+        put(_Failure(error))
+        return
+    put(_END)
+
+
+_END = object()  # marks the end of the batches in a BatchIterator queue
+
+
+class _Failure:
+    """an exception raised while reading batches, passed through the queue to be raised by __anext__"""
+    def __init__(self, error):
+        self.error = error
+
+
+def _read_in_process(schema, path, kwargs):
+    """worker function for aread_file, returns the FileResult of one file"""
+    return schema.read(path, **kwargs)
@@ -0,0 +1,174 @@
+""" Caching of parsed csv files, so unchanged files are not parsed again """
+
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .csvReader2 import CsvReadError
+
+
+class ParseCache:
+    """
+    A cache of the results of CsvFile.read_file.
+    Results are keyed on the identity of the file (its path, size and modification time, or a hash of
+    its contents) along with the MetaData settings and the fields, so a change to any of them is a miss.
+    Recently used results are kept in memory up to a budget, the least recently used being evicted first;
+    if a directory is given every result is also written there and reloaded from disk on a memory miss.
+    """
+    def __init__(self, max_bytes=256 * 1024 * 1024, directory=None, use_hash=False):
+        """
+        :param max_bytes: the approximate amount of memory the cached results may take up
+        :param directory: a directory in which to keep results on disk, or None for memory only
+        :param use_hash: if true files are identified by a hash of their contents rather than size and mtime
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.use_hash = use_hash
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def read_file(self, csv_file, **kwargs):
+        """
+        fills in csv_file.data, null_count and error_count from the cache if possible,
+        otherwise reads the file with csv_file.read_file(**kwargs) and caches the result.
+        Reads filtered with where= are not cached (the predicates cannot be told apart by a key), nor are reads
+        of a csv_file with a quarantine or error budget, which must see every row; the file is just read
+        :return: the data read
+        """
+        if kwargs.get("where") or csv_file.quarantine is not None or csv_file.error_budget is not None:
+            csv_file.read_file(**kwargs)
+            return csv_file.data
+        key = self.key(csv_file, kwargs.get("encoding", "utf-8"))
+        entry = None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                entry = self._entries[key][0]
+                self.hits += 1
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, entry)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            csv_file.read_file(**kwargs)
+            entry = (csv_file.data, csv_file.null_count, csv_file.error_count)
+            self._remember(key, entry)
+            self._save(key, entry)
+        # the caller is given a copy, so modifying it does not change the cache
+        csv_file.data, csv_file.null_count, csv_file.error_count = _copy(entry)
+        return csv_file.data
+
+    def key(self, csv_file, encoding="utf-8"):
+        """returns a hex digest identifying the file and the settings (and encoding) it is read with"""
+        try:
+            stat = os.stat(csv_file.filepath)
+        except OSError:
+            raise CsvReadError("FileUnopenable")
+        if self.use_hash:
+            identity = (os.path.abspath(csv_file.filepath), _file_hash(csv_file.filepath))
+        else:
+            identity = (os.path.abspath(csv_file.filepath), stat.st_size, stat.st_mtime_ns)
+        metadata = csv_file.metadata
+        settings = (metadata.cell_border.pattern, metadata.row_border.pattern, metadata.empty_cell.pattern,
+                    metadata.markers, metadata.heading_row, metadata.unit_row, metadata.data_row,
+                    metadata.quotechar, csv_file.tokenizer.name, csv_file.record is not None, csv_file.by_name)
+        types = sorted((name, type.regex, _type_name(type.output_type)) for name, type in metadata.types.items())
+        fields = [(field.name, field.type_name, field.units) for field in csv_file.fields]
+        return hashlib.sha1(repr((identity, settings, types, fields, encoding)).encode()).hexdigest()
+
+    def stats(self):
+        """returns a dictionary of the cache hit and miss counts and the memory in use"""
+        with self._lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "evictions": self.evictions, "entries": len(self._entries), "bytes": self.size}
+
+    def clear(self):
+        """empties the in memory cache, files on disk are kept"""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remember(self, key, entry):
+        size = _estimate_size(entry[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (entry, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), "rb") as cache_file:
+                return pickle.load(cache_file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _save(self, key, entry):
+        if self.directory is None:
+            return
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as cache_file:
+                pickle.dump(entry, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def _copy(entry):
+    """copies the rows and counts of a cached entry, records are immutable so they are shared rather than copied"""
+    data, null_count, error_count = entry
+    if data and isinstance(data[0], tuple):
+        return list(data), list(null_count), list(error_count)
+    return [list(row) for row in data], list(null_count), list(error_count)
+
+
+def _type_name(output_type):
+    return getattr(output_type, "__module__", "") + "." + getattr(output_type, "__qualname__", repr(output_type))
+
+
+def _file_hash(path, block_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, "rb") as data_file:
+        for block in iter(lambda: data_file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _estimate_size(data):
+    """an approximation of the memory taken up by a list of rows"""
+    size = sys.getsizeof(data)
+    for row in data:
+        size += sys.getsizeof(row)
+        for value in row:
+            if value is not None:
+                size += sys.getsizeof(value)
+    return size
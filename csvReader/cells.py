@@ -0,0 +1,61 @@
+""" Conversion of single cells to the type of their field, shared by every row converter """
+
+import re
+
+
+class _Missing:
+    """the result of converting a cell which has no value (see compile_cell_converter)"""
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+EMPTY = _Missing("EMPTY")  # a cell matching the empty_cell pattern of the MetaData
+UNREADABLE = _Missing("UNREADABLE")  # a cell which is not empty, but cannot be read as its type
+
+
+def compile_cell_converter(field_type, empty_match, cache=None):
+    """
+    Compiles a function convert_cell(cell) converting the text of one cell to the type of a field.
+    A cell matching the type's regex is cast to the type, otherwise EMPTY is returned if the cell is matched by
+    empty_match, and UNREADABLE if not. A cell which matches but cannot be cast (such as the full_date
+    29-02-1961) is UNREADABLE too. The regex is compiled once here, so converting a cell costs one match
+    and one cast.
+
+    :param field_type: the Type of the field
+    :param empty_match: the match method of the MetaData's empty_cell pattern
+    :param cache: a ConversionCache, each cell is looked up in it before being matched and cast,
+     and the values of cells which are read are added to it
+    """
+    regex = field_type.regex
+    match = re.compile(regex).match if regex is not None else None
+    cast = getattr(field_type, "cast", field_type.output_type)  # types from csvReader have no cast
+    if cast is str:
+        cast = None
+
+    def convert_cell(cell):
+        if match is None or match(cell):
+            if cast is None:
+                return cell
+            try:
+                return cast(cell)
+            except ValueError:
+                return UNREADABLE
+        return EMPTY if empty_match(cell) else UNREADABLE
+
+    if cache is None:
+        return convert_cell
+    get = cache.get
+    add = cache.add
+
+    def convert_cached(cell):
+        value = get(cell)
+        if value is None:
+            value = convert_cell(cell)
+            if value is not EMPTY and value is not UNREADABLE:
+                add(cell, value)
+        return value
+
+    return convert_cached
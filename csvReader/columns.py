@@ -0,0 +1,143 @@
+""" Columnar storage for data read from csv files """
+
+from array import array
+
+from .cells import EMPTY, UNREADABLE, compile_cell_converter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# array typecodes used to store the values of each output type, other types are kept in lists
+TYPECODES = {int: "q", float: "d"}
+FILL_VALUES = {"q": 0, "d": float("nan")}
+
+
+class Column:
+    """
+    The values of one field, along with a validity mask which is 0 wherever the cell was empty or unreadable.
+    Integer and float fields are stored in typed arrays (array('q') / array('d'), or numpy arrays when
+    numpy is installed), other fields are stored in lists
+    """
+    def __init__(self, name, units, values, valid):
+        self.name = name
+        self.units = units
+        self.values = values
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        """returns the value at row i, or None if the cell was empty or unreadable"""
+        return self.values[i] if self.valid[i] else None
+
+    def __iter__(self):
+        for value, valid in zip(self.values, self.valid):
+            yield value if valid else None
+
+    def to_list(self):
+        """returns the values of the column as a list, with None for empty or unreadable cells"""
+        return list(self)
+
+
+class ColumnData:
+    """
+    A labelled collection of columns; columns are looked up by field name,
+    the units and headings of the columns are kept in the same order as the fields
+    """
+    def __init__(self, columns):
+        self.columns = columns
+        self.headings = [column.name for column in columns]
+        self.units = [column.units for column in columns]
+        self.length = len(columns[0]) if columns else 0
+        self._by_name = {column.name: column for column in columns}
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def __iter__(self):
+        return iter(self.headings)
+
+    def __len__(self):
+        return self.length
+
+    def rows(self):
+        """generator yielding the data a row at a time, as lists with None for empty or unreadable cells"""
+        for row in zip(*self.columns):
+            yield list(row)
+
+
+class ColumnBuilder:
+    """Typed columns which are filled one row at a time as the file is converted"""
+    def __init__(self, fields):
+        self.fields = fields
+        self.values = []
+        self.valid = []
+        for field in fields:
+            typecode = TYPECODES.get(field.type.output_type)
+            self.values.append(array(typecode) if typecode else [])
+            self.valid.append(bytearray())
+
+    def compile_converter(self, metadata, caches=None):
+        """
+        Compiles a function convert_row(row, null_count, error_count) which converts one row of cells
+        and appends the values straight onto the columns, counting empty and unreadable cells (and looking
+        cells up in the conversion caches given for each field name) in the same way as
+        csvReader2.compile_converter. So that bad rows can be found (see csvReader2.guard_converter) it returns
+        an empty tuple for a row with a value in every cell, or else a list holding None for each cell with no value
+        """
+        empty_match = metadata.empty_cell.match
+        columns = []
+        for j, field in enumerate(self.fields):
+            convert_cell = compile_cell_converter(field.type, empty_match, caches.get(field.name) if caches else None)
+            values = self.values[j]
+            fill = FILL_VALUES.get(getattr(values, "typecode", None))
+            columns.append((j, convert_cell, values.append, self.valid[j].append, fill))
+        columns = tuple(columns)
+        num_fields = len(columns)
+
+        def convert_row(row, null_count, error_count):
+            missing = ()
+            for j, convert_cell, append, append_valid, fill in columns:
+                value = convert_cell(row[j])
+                if value is EMPTY or value is UNREADABLE:
+                    if value is EMPTY:
+                        null_count[j] += 1
+                    else:
+                        error_count[j] += 1
+                    append(fill)
+                    append_valid(0)
+                    if not missing:
+                        missing = [True]*num_fields
+                    missing[j] = None
+                else:
+                    append(value)
+                    append_valid(1)
+            return missing
+
+        return convert_row
+
+    def finish(self, use_numpy=None):
+        """
+        returns the filled columns as a ColumnData object
+        :param use_numpy: if true the typed arrays are wrapped as numpy arrays (without copying), by default
+         numpy is used whenever it is installed
+        """
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        elif use_numpy and numpy is None:
+            raise ImportError("numpy is not installed")
+        columns = []
+        for field, values, valid in zip(self.fields, self.values, self.valid):
+            if use_numpy:
+                if isinstance(values, array):
+                    values = numpy.frombuffer(values, dtype=numpy.dtype(values.typecode)) if values \
+                        else numpy.array([], dtype=numpy.dtype(values.typecode))
+                valid = numpy.frombuffer(valid, dtype=numpy.bool_) if valid else numpy.array([], dtype=numpy.bool_)
+            columns.append(Column(field.name, field.units, values, valid))
+        return ColumnData(columns)
@@ -169,6 +169,9 @@ def split_by_values(data, sort_col, value_range):
     sort lists by variable in the sorting column (relies on this value being of integer type)
     - for each value within the given range a separate list of lists is created
     - if a value in the rage is not found in the sorting column it will result in an empty list
+
+    grouping.group_by and grouping.SortedIndex do the same for any column and type of value,
+    returning the number of rejected rows rather than printing it
     """
     data_sorted = [[] for i in range(value_range[0], value_range[1])]
     error_count = 0
@@ -285,14 +288,15 @@ class Type:
     def __init__(self, regex = None, output_type = str):
         self.regex = regex
         self.output_type = output_type
+        self.pattern = re.compile(regex) if regex is not None else None
 
     def check(self, string):
         """
         :param string: the string to be checked
         :return: boolean - true if the string matches the given regex
         """
-        if self.regex is not None:
-            return bool(re.compile(self.regex).match(string))
+        if self.pattern is not None:
+            return bool(self.pattern.match(string))
         return True
 
 
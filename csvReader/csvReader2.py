@@ -3,18 +3,350 @@
 import sys
 import os
 import re
-from django.core.exceptions import ValidationError
+import bz2
+import gzip
+import lzma
+import mmap
+import time
+import io
+import codecs
+import fnmatch
+import functools
+from datetime import date
+from collections import deque, namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from .cells import EMPTY, UNREADABLE, compile_cell_converter
+from .columns import ColumnBuilder
+from .grouping import column_indexes
+from .index import INDEX_EVERY, SUFFIX, RowIndex, load_index
+from .tokenizers import literal_text, make_tokenizer, raw_row
+
+BLOCK_SIZE = 64 * 1024  # characters read from the file at a time when streaming
+CHUNK_SIZE = 10000  # rows sent to a worker process at a time when parsing in parallel
+MEMO_SIZE = 1024  # distinct cells remembered for each memoized field, unless another size is given
+COMPRESSIONS = [  # the magic bytes each compressed file starts with, and the function opening it
+    ("gzip", b"\x1f\x8b", gzip.open),
+    ("bz2", b"BZh", bz2.open),
+    ("xz", b"\xfd7zXZ\x00", lzma.open),
+]
+
 
 def fields(fields_list):
     return [Field(*field) for field in fields_list]
 
-def read(directory, file, fields):
+
+def compression(path):
+    """returns the name of the compression of a file ("gzip", "bz2" or "xz"), found from its first bytes, or None"""
+    try:
+        with open(path, "rb") as data_file:
+            start = data_file.read(6)
+    except OSError:
+        raise CsvReadError("FileUnopenable")
+    for name, magic, _ in COMPRESSIONS:
+        if start.startswith(magic):
+            return name
+    return None
+
+
+def open_text(path, encoding=None):
+    """
+    opens a file for reading as text; a gzip, bz2 or xz compressed file is decompressed as it is read,
+    so only the part being read is ever held in memory
+    :param encoding: the encoding of the (decompressed) text, by default the locale's encoding
+    """
+    name = compression(path)
+    try:
+        for compressed, _, open_compressed in COMPRESSIONS:
+            if name == compressed:
+                return open_compressed(path, "rt", encoding=encoding)
+        return open(path, "r", encoding=encoding)
+    except OSError:
+        raise CsvReadError("FileUnopenable")
+
+_RECORD_TYPES = {}
+
+
+def record_type(fields):
+    """
+    returns the record class for rows of the given fields, read with CsvFile(records=True):
+    a namedtuple with an attribute named after each field (names which are not identifiers are
+    replaced by their position, e.g. _2). Records are immutable and have no per-row dictionary:
+    a record of the seven default weather fields takes 96 bytes (sys.getsizeof) against 112 for a list row.
+    Measured with tracemalloc over 100,000 synthetic weather rows, read_file keeps 233 bytes per row
+    as records against 241 as lists, values included (python 3.11).
+    Fields with the same names share a class, and records can be pickled (e.g. to worker processes)
+    """
+    return _record_class(tuple(field.name for field in fields))
+
+
+def _record_class(names):
+    record = _RECORD_TYPES.get(names)
+    if record is None:
+        record = namedtuple("Record", names, rename=True)
+        record.__reduce__ = lambda row: (_make_record, (names, tuple(row)))
+        _RECORD_TYPES[names] = record
+    return record
+
+
+def _make_record(names, values):
+    """rebuilds a pickled record"""
+    return tuple.__new__(_record_class(names), values)
+
+
+def compile_converter(fields, metadata, where=None, record=None, caches=None):
+    """
+    Compiles a list of activated fields into a single function converting one row of cells,
+    each cell being converted by a function made by cells.compile_cell_converter.
+
+    :param fields: a list of Field objects whose types have been activated
+    :param metadata: the MetaData of the file, giving the empty_cell pattern
+    :param where: a dictionary mapping field names to predicates, functions taking the converted value
+     of the field and returning true if the row should be kept. The predicate columns are converted first,
+     and a row failing any of them (or with an empty or unreadable value in one of them) is dropped
+     without converting or counting the rest of its cells
+    :param record: a class made by record_type, to return each row as a record rather than a list
+    :param caches: a dictionary mapping field names to ConversionCache objects, the cells of those fields
+     are looked up in their cache before being matched and cast
+    :return: a function convert_row(row, null_count, error_count) which returns a list (or record) of the
+     converted values of the first len(fields) cells of the row, or None if the row is dropped; empty cells are
+     counted in null_count and unreadable cells in error_count, both are given the value None
+    """
+    empty_match = metadata.empty_cell.match
+    columns = tuple((j, compile_cell_converter(field.type, empty_match, caches.get(field.name) if caches else None))
+                    for j, field in enumerate(fields))
+    num_fields = len(columns)
+    new = tuple.__new__
+    if where:
+        return _compile_filtered_converter(fields, columns, where, record)
+
+    def convert_row(row, null_count, error_count):
+        converted = [None]*num_fields
+        for j, convert_cell in columns:
+            value = convert_cell(row[j])
+            if value is EMPTY:
+                null_count[j] += 1
+            elif value is UNREADABLE:
+                error_count[j] += 1
+            else:
+                converted[j] = value
+        return converted if record is None else new(record, converted)
+
+    return convert_row
+
+
+def _compile_filtered_converter(fields, columns, where, record=None):
+    """compile_converter for rows filtered by predicates, taking the (index, cell converter) of each column"""
+    names = [field.name for field in fields]
+    unknown = [name for name in where if name not in names]
+    if unknown:
+        raise ValueError("predicates given for unknown fields: " + ", ".join(unknown))
+    predicates = tuple(columns[names.index(name)] + (test,) for name, test in where.items())
+    tested = set(column[0] for column in predicates)
+    others = tuple(column for column in columns if column[0] not in tested)
+    num_fields = len(columns)
+    new = tuple.__new__
+
+    def convert_row(row, null_count, error_count):
+        converted = [None]*num_fields
+        for j, convert_cell, test in predicates:
+            value = convert_cell(row[j])
+            if value is EMPTY or value is UNREADABLE or not test(value):
+                return None
+            converted[j] = value
+        for j, convert_cell in others:
+            value = convert_cell(row[j])
+            if value is EMPTY:
+                null_count[j] += 1
+            elif value is UNREADABLE:
+                error_count[j] += 1
+            else:
+                converted[j] = value
+        return converted if record is None else new(record, converted)
+
+    return convert_row
+
+
+def guard_converter(convert_row, fields, first_row=0, error_budget=None, quarantine=None, cell_border=",",
+                    empty_cell=None):
+    """
+    Wraps a row converter (as made by compile_converter) to deal with bad rows rather than failing part way
+    through a file: rows with fewer cells than there are fields, and rows with unreadable cells.
+    A cell is unreadable here if it has no value and is not wholly matched by the empty_cell pattern
+    (null_count counts any cell starting with a match of it, which with the default "" is every cell).
+    Rows are numbered as they are converted, from first_row (the MetaData.data_row of the file).
+
+    :param convert_row: the converter to wrap
+    :param fields: the list of fields of the file
+    :param first_row: the number of the first row converted
+    :param error_budget: an ErrorBudget, when it is exceeded a CsvReadError("ErrorBudgetExceeded") is raised
+    :param quarantine: a Quarantine to record each bad row in. Short rows are left out of the data (and counted
+     against the error budget) if either is given, otherwise they raise a CsvReadError("ShortRow")
+    :param cell_border: the text put between the cells of a bad row when it is recorded, for rows which are
+     not RawRow objects holding the text of the row in the file (see tokenizers.RawRow)
+    :param empty_cell: the compiled empty_cell pattern of the MetaData, by default only "" is empty
+    :return: a function convert_row(row, null_count, error_count) like the one wrapped,
+     returning None for rows which are left out
+    """
+    names = [field.name for field in fields]
+    num_fields = len(fields)
+    checked = error_budget is not None or quarantine is not None
+    empty_match = (empty_cell or re.compile("")).fullmatch
+    row_number = first_row - 1
+    bad_rows = 0
+
+    def bad_row(cells, reason):
+        nonlocal bad_rows
+        bad_rows += 1
+        if quarantine is not None:
+            text = getattr(cells, "text", None)
+            quarantine.add(row_number, text if text is not None else cell_border.join(cells), reason)
+        if error_budget is not None:
+            error_budget.check(bad_rows, row_number - first_row + 1, row_number, reason)
+
+    def guarded(row, null_count, error_count):
+        nonlocal row_number
+        row_number += 1
+        if len(row) < num_fields:
+            if not checked:
+                raise CsvReadError("ShortRow", {"row": row_number, "cells": row, "fields": num_fields})
+            bad_row(row, "short row: {} of {} cells".format(len(row), num_fields))
+            return None
+        if not checked:
+            return convert_row(row, null_count, error_count)
+        converted = convert_row(row, null_count, error_count)
+        if converted is not None and None in converted:
+            unreadable = [names[j] for j in range(num_fields) if converted[j] is None and not empty_match(row[j])]
+            if unreadable:
+                bad_row(row, "unreadable cells: " + ", ".join(unreadable))
+        return converted
+
+    return guarded
+
+
+def read(directory, file, fields, workers=None, chunk_size=CHUNK_SIZE, where=None):
     path = os.path.join(directory, file)
     csv = CsvFile(fields=fields, filepath=path)
-    csv.read_file()
+    csv.read_file(workers=workers, chunk_size=chunk_size, where=where)
     return csv.data
 
 
+def read_directory(directory, fields, pattern="*", workers=None, metadata=None):
+    """
+    Reads every file in a directory whose name matches a pattern, using a pool of worker processes.
+    A file which cannot be read does not stop the others, its error is kept in its result instead.
+
+    :param directory: the directory containing the files
+    :param fields: a list of Field objects describing the columns of the files
+    :param pattern: a shell style pattern (as used by fnmatch) selecting the files to read
+    :param workers: the number of worker processes, by default one per cpu
+    :param metadata: the MetaData describing the layout of the files
+    :return: an OrderedDict mapping each file name (in sorted order) to a FileResult
+    """
+    try:
+        files = sorted(name for name in os.listdir(directory)
+                       if fnmatch.fnmatch(name, pattern) and not name.endswith(SUFFIX)
+                       and os.path.isfile(os.path.join(directory, name)))
+    except OSError:
+        raise CsvReadError("NoDataDirectory")
+    schema = Schema(metadata, fields)
+    results = OrderedDict()
+    if not files:
+        return results
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [(name, executor.submit(schema.read, os.path.join(directory, name))) for name in files]
+        for name, future in futures:
+            error = future.exception()
+            if error is not None:
+                results[name] = FileResult(error=error)
+            else:
+                results[name] = future.result()
+    return results
+
+
+def _convert_chunk(metadata, fields, texts, where=None, records=False, first_row=0, columns=None, memoize=None):
+    """
+    Worker function for parallel parsing: splits and converts a chunk of row texts.
+    Blank rows at the start and end of the chunk are counted rather than converted,
+    as whether they are kept depends on the rows in the neighbouring chunks.
+    first_row is the number of the chunk's first row in the file, for reporting short rows,
+    and columns the index of the column of each field when they are bound by name.
+    The fields named in memoize (see Schema) are converted with conversion caches made for the chunk
+
+    :return: a tuple (leading_blanks, rows, trailing_blanks, null_count, error_count, cache_counts),
+     trailing_blanks is None if the chunk has no rows other than blank ones,
+     cache_counts maps the name of each memoized field to the hits and misses of its cache
+    """
+    caches = conversion_caches(memoize)
+    convert = compile_converter(fields, metadata, where, record_type(fields) if records else None, caches)
+    convert_row = None
+    split_cells = make_tokenizer(metadata, columns).split_cells
+    markers = metadata.markers
+    null_count = [0]*len(fields)
+    error_count = [0]*len(fields)
+    leading = None
+    blank_rows = 0
+    rows = []
+    for text in texts:
+        for char in markers:
+            text = text.replace(char, "")
+        text = text.strip()
+        if not text:
+            blank_rows += 1
+            continue
+        if leading is None:
+            leading = blank_rows
+            convert_row = guard_converter(convert, fields, first_row + leading)
+        else:
+            for _ in range(blank_rows):
+                rows.append(convert_row([""], null_count, error_count))
+        blank_rows = 0
+        rows.append(convert_row(split_cells(text), null_count, error_count))
+    cache_counts = dict((name, (cache.hits, cache.misses)) for name, cache in caches.items())
+    if leading is None:
+        return blank_rows, [], None, null_count, error_count, cache_counts
+    return leading, [row for row in rows if row is not None], blank_rows, null_count, error_count, cache_counts
+
+
+def _bytes_pattern(pattern):
+    """returns a copy of a compiled str regex which matches bytes (for use on memory mapped files)"""
+    return re.compile(pattern.pattern.encode(), pattern.flags & ~re.UNICODE)
+
+
+class _EmptyMap(bytes):
+    """an empty bytes object standing in for the memory map of an empty file"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _TextReader:
+    """
+    a read only file object over a string, for reading just the start of a text already in memory:
+    unlike io.StringIO it does not copy the whole string, only each block or line as it is read
+    """
+    def __init__(self, text):
+        self.text = text
+        self.position = 0
+
+    def read(self, size=-1):
+        start = self.position
+        self.position = len(self.text) if size < 0 else min(start + size, len(self.text))
+        return self.text[start:self.position]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = self.position
+        if start >= len(self.text):
+            raise StopIteration
+        end = self.text.find("\n", start)
+        self.position = len(self.text) if end < 0 else end + 1
+        return self.text[start:self.position]
+
+
 class CsvReadError(Exception):
     """Error class for reporting errors related to reading CSV files"""
     def __init__(self, value, info=""):
@@ -22,6 +354,141 @@ class CsvReadError(Exception):
         self.info = info
 
 
+class FileResult:
+    """The outcome of reading one file in a batch: its data and counts, or the error which stopped it"""
+    def __init__(self, data=None, null_count=None, error_count=None, error=None):
+        self.data = data
+        self.null_count = null_count
+        self.error_count = error_count
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class ErrorBudget:
+    """
+    The number of bad rows (rows with unreadable cells, or too few cells) a read may meet before it is
+    abandoned with a CsvReadError("ErrorBudgetExceeded"), so a badly mis-specified file fails within
+    its first few rows rather than after being parsed in full
+    """
+    def __init__(self, max_rows=None, max_rate=None, sample_rows=1000):
+        """
+        :param max_rows: the number of bad rows allowed in the whole file
+        :param max_rate: the fraction of bad rows allowed among the first 'sample_rows' data rows,
+         the read stops as soon as more than max_rate * sample_rows of them have been bad
+        :param sample_rows: the number of rows max_rate applies to
+        """
+        if max_rows is None and max_rate is None:
+            raise ValueError("an error budget needs max_rows or max_rate")
+        if sample_rows < 1:
+            raise ValueError("sample_rows must be at least 1")
+        self.max_rows = max_rows
+        self.max_rate = max_rate
+        self.sample_rows = sample_rows
+
+    def check(self, bad_rows, rows, row_number, reason):
+        """raises a CsvReadError if 'bad_rows' bad rows out of the first 'rows' rows read are over budget"""
+        over = self.max_rows is not None and bad_rows > self.max_rows
+        if self.max_rate is not None and rows <= self.sample_rows:
+            over = over or bad_rows > self.max_rate * self.sample_rows
+        if over:
+            raise CsvReadError("ErrorBudgetExceeded", {
+                "row": row_number, "reason": reason, "bad_rows": bad_rows, "rows": rows,
+                "max_rows": self.max_rows, "max_rate": self.max_rate, "sample_rows": self.sample_rows})
+
+
+class Quarantine:
+    """
+    A bounded log of the bad rows met while reading, holding the row number, text and reason for each
+    of the first 'max_rows' of them in 'rows' ('count' counts them all).
+    Rows with too few cells are left out of the data, rows with unreadable cells are kept
+    (with None for those cells) and counted in error_count as usual
+    """
+    def __init__(self, max_rows=1000):
+        self.max_rows = max_rows
+        self.rows = []
+        self.count = 0
+
+    def add(self, row_number, text, reason):
+        self.count += 1
+        if len(self.rows) < self.max_rows:
+            self.rows.append((row_number, text, reason))
+
+    def clear(self):
+        self.rows = []
+        self.count = 0
+
+
+class ConversionCache:
+    """
+    A bounded map from the text of the cells of one field to their converted values, for fields with few
+    distinct values (years, months, days of air frost): a repeated cell costs a dictionary lookup rather than
+    a regex match and a cast, and all the cells with the same text share one value object.
+    Only cells which were read are remembered, empty and unreadable cells are matched every time.
+    Once 'max_size' cells are remembered the oldest is forgotten as each new one is added.
+    'hits' and 'misses' count the lookups made by every read using the cache
+    """
+    def __init__(self, max_size=MEMO_SIZE):
+        if max_size < 1:
+            raise ValueError("a conversion cache must hold at least one value")
+        self.max_size = max_size
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, cell):
+        """returns the value of a cell, or None if it is not remembered"""
+        value = self.values.get(cell)
+        if value is not None:
+            self.hits += 1
+        return value
+
+    def add(self, cell, value):
+        """remembers the value of a cell which was not found by get"""
+        values = self.values
+        self.misses += 1
+        if len(values) >= self.max_size:
+            try:
+                del values[next(iter(values))]
+                self.evictions += 1
+            except (KeyError, RuntimeError, StopIteration):
+                pass  # changed by another thread reading with the same cache
+        values[cell] = value
+
+    def clear(self):
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+def conversion_caches(memoize):
+    """
+    returns a dictionary mapping field names to new ConversionCache objects
+    :param memoize: a list of field names, or a dictionary mapping field names to the number of cells
+     to remember for each (see ConversionCache)
+    """
+    if not memoize:
+        return {}
+    if not isinstance(memoize, dict):
+        memoize = dict((name, MEMO_SIZE) for name in memoize)
+    return dict((name, ConversionCache(size)) for name, size in memoize.items())
+
+
+class _FollowState:
+    """The position reached in a file being followed by CsvFile.read_new"""
+    def __init__(self, encoding, convert_row):
+        self.convert_row = convert_row  # the row converter, kept so bad rows are numbered across reads
+        self.offset = 0
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.partial = ""  # the text of the last row read, which may not have been completely written yet
+        self.rows = 0  # the number of rows passed, counting from the first non blank row
+        self.blank_rows = None  # blank rows waiting to see if any more data follows them
+
+
 class MetaData:
     """Metadata  describing the formatting of a csv file"""
     def __init__(self,
@@ -31,8 +498,16 @@ class MetaData:
                  markers="",  # "*#"
                  heading_row=0,
                  unit_row=None,
-                 data_row=1
+                 data_row=1,
+                 quotechar=None,
+                 tokenizer=None
                  ):
+        """
+        :param quotechar: the character quoting cells which contain the cell border or newlines,
+         or None if cells are never quoted
+        :param tokenizer: the name of the tokenizer splitting rows and cells ("csv", "split" or "regex"),
+         by default the fastest one able to read the file is chosen (see tokenizers.make_tokenizer)
+        """
         self.cell_border = re.compile(cell_border)
         self.row_border = re.compile(row_border)
         self.empty_cell = re.compile(empty_cell)
@@ -40,12 +515,14 @@ class MetaData:
         self.heading_row = heading_row
         self.unit_row = unit_row
         self.data_row = data_row
+        self.quotechar = quotechar
+        self.tokenizer = tokenizer
         self.types = {
             "universal":Type(),
             "date":Type(r"[0-9]{4}$", int),
             "integer":Type(r"-?[0-9]+$", int),
             "float":Type(r"-?[0-9]+\.?[0-9]*$", float),
-            "full_date":Type(r"[0-9]{2}-[0-9]{2}-[0-9]{4}")
+            "full_date":Type(r"(0[1-9]|[12][0-9]|3[01])-(0[1-9]|1[0-2])-[0-9]{4}$", date, parse_full_date)
         }
 
 
@@ -55,17 +532,23 @@ class Type:
     and the type to which it should be converted
     """
 
-    def __init__(self, regex = None, output_type = str):
+    def __init__(self, regex = None, output_type = str, cast = None):
+        """
+        :param cast: the function converting a matching string to the output type, by default the
+         output type itself
+        """
         self.regex = regex
         self.output_type = output_type
+        self.cast = cast if cast is not None else output_type
+        self.pattern = re.compile(regex) if regex is not None else None
 
     def check(self, string):
         """
         :param string: the string to be checked
         :return: boolean - true if the string matches the given regex
         """
-        if self.regex is not None:
-            return bool(re.compile(self.regex).match(string))
+        if self.pattern is not None:
+            return bool(self.pattern.match(string))
         return True
 
     def convert(self, string):
@@ -76,12 +559,22 @@ class Type:
         """
         if self.check(string):
             try:
-                return self.output_type(string)
+                return self.cast(string)
             except ValueError:
                 raise ValueError('cannot convert "'+string+'" to type '+str(self.output_type))
         raise ValueError('String: "'+string+'" does not match the regex:"'+self.regex+'"')
 
 
+@functools.lru_cache(maxsize=4096)
+def parse_full_date(string):
+    """
+    converts the text of a full_date cell (dd-mm-yyyy) to a datetime.date.
+    The same dates turn up over and over (in every file of a set of stations, for instance), so the dates
+    of the most recently converted strings are remembered, and shared between all the cells holding them
+    """
+    return date(int(string[6:10]), int(string[3:5]), int(string[:2]))
+
+
 
 class Field:
     def __init__(self, name, type_name="universal", units=""):
@@ -98,33 +591,174 @@ class Field:
         except KeyError: raise ValueError(self.type_name+" is not a valid type")
 
 
+DEFAULT_FIELDS = (
+    ("yyyy", "date"),
+    ("mm", "integer"),
+    ("tmax", "float", "degC"),
+    ("tmin", "float", "degC"),
+    ("af", "integer", "days"),
+    ("rain", "float", "mm"),
+    ("sun", "float", "hours"),
+)
+
+
+class Schema:
+    """
+    The compiled description of a kind of csv file: its MetaData and fields, with the row converter,
+    tokenizer and record class built from them. A schema is built once and never changed by reading,
+    so one schema can be shared by any number of threads, each read making its own CsvFile (or FileResult):
+
+        schema = Schema(metadata, fields)
+        result = schema.read(path)
+
+    The fields are copied, so the Field objects given are not changed and may be shared between schemas
+    """
+    def __init__(self, metadata=None, fields=None, records=False, by_name=False, memoize=None):
+        """
+        :param metadata: the MetaData of the files, by default MetaData()
+        :param fields: a list of Field objects, by default the fields of DEFAULT_FIELDS
+        :param records: if true each data row is read as an immutable record (see record_type),
+         whose values can be got by field name as well as by index, rather than as a list
+        :param by_name: if true each field is read from the column whose heading is the name of the field,
+         so the fields may be any of the columns of the file in any order; the other columns are not
+         stripped, converted or stored. The columns are found from the heading row at the start of each read
+        :param memoize: the names of the fields whose conversions are remembered (see ConversionCache), as a list,
+         or a dictionary mapping each name to the number of distinct cells to remember. The caches are shared
+         by every read made with the schema
+        """
+        if metadata is None:
+            metadata = MetaData()
+        if fields is None:
+            fields = [Field(*spec) for spec in DEFAULT_FIELDS]
+        if by_name and metadata.heading_row is None:
+            raise ValueError("fields can only be bound to columns by name if the file has a heading row")
+        copies = []
+        for field in fields:
+            field = Field(field.name, field.type_name, field.units)
+            field.activate_type(metadata.types)
+            copies.append(field)
+        self.caches = conversion_caches(memoize)
+        unknown = [name for name in self.caches if name not in [field.name for field in copies]]
+        if unknown:
+            raise ValueError("conversions memoized for unknown fields: " + ", ".join(unknown))
+        self.metadata = metadata
+        self.fields = tuple(copies)
+        self.records = records
+        self.by_name = by_name
+        self.memoize = dict((name, cache.max_size) for name, cache in self.caches.items())
+        self.record = record_type(copies) if records else None
+        self.converter = compile_converter(copies, metadata, record=self.record, caches=self.caches)
+        self.tokenizer = make_tokenizer(metadata)
+
+    def __reduce__(self):
+        # the compiled parts cannot be pickled, so a schema sent to another process is compiled again there
+        # (with empty conversion caches)
+        return Schema, (self.metadata, list(self.fields), self.records, self.by_name, self.memoize)
+
+    def csv_file(self, filepath=None, metrics=None, error_budget=None, quarantine=None):
+        """returns a new CsvFile for reading one file with this schema"""
+        return CsvFile(filepath=filepath, metrics=metrics, error_budget=error_budget, quarantine=quarantine,
+                       schema=self)
+
+    def read(self, filepath, metrics=None, error_budget=None, quarantine=None, **kwargs):
+        """
+        reads a file as CsvFile.read_file(**kwargs) does, without changing the schema
+        :return: a FileResult holding the data, null_count and error_count of the file
+        """
+        csv_file = self.csv_file(filepath, metrics, error_budget, quarantine)
+        csv_file.read_file(**kwargs)
+        return FileResult(csv_file.data, csv_file.null_count, csv_file.error_count)
+
+
 class CsvFile:
     """
-    a wrapper containing the  three other file metadata classes,
-    (TableDelimiters, DataTypes and Labels)
+    One csv file being read, with the statistics and data of the last read of it.
+    The description of the file is kept in a Schema, which may be shared by many CsvFile objects
     """
     def __init__(self,
-                 metadata=MetaData(),
-                 fields=[
-                     Field("yyyy", "date"),
-                     Field("mm", "integer"),
-                     Field("tmax", "float","degC"),
-                     Field("tmin", "float","degC"),
-                     Field("af", "integer","days"),
-                     Field("rain", "float","mm"),
-                     Field("sun","float","hours")
-                 ],
-                 filepath = None
+                 metadata=None,
+                 fields=None,
+                 filepath = None,
+                 metrics = None,
+                 records = False,
+                 error_budget = None,
+                 quarantine = None,
+                 by_name = False,
+                 schema = None,
+                 memoize = None
                  ):
-        self.metadata = metadata
-        for field in fields:
-            field.activate_type(metadata.types)
-        self.fields = fields
-        self.num_fields =len(fields)
+        """
+        :param metadata: the MetaData of the file, by default MetaData()
+        :param fields: a list of Field objects, by default the Met Office weather fields of DEFAULT_FIELDS
+        :param metrics: a metrics.Metrics object to be told the time taken by each stage of a read
+         and the statistics of each read, or None to skip measuring
+        :param records: if true each data row is read as an immutable record (see Schema)
+        :param error_budget: an ErrorBudget, limiting the bad rows a read may meet before it is abandoned
+        :param quarantine: a Quarantine recording the bad rows met. Rows with too few cells are left out
+         of the data if an error budget or quarantine is given, otherwise they raise a CsvReadError("ShortRow")
+        :param by_name: if true the fields are bound to the columns with their names as headings (see Schema)
+        :param schema: a compiled Schema to read the file with, in place of metadata, fields, records, by_name
+         and memoize
+        :param memoize: the fields whose conversions are remembered (see Schema)
+        """
+        if schema is None:
+            schema = Schema(metadata, fields, records, by_name, memoize)
+        self.schema = schema
+        self.metadata = schema.metadata
+        self.fields = schema.fields
+        self.num_fields =len(schema.fields)
+        self.record = schema.record
+        self._convert = schema.converter
+        self.tokenizer = schema.tokenizer
+        self.by_name = schema.by_name
+        self.columns = None  # the index of the column of each field, once bound by name
+        self._heading_tokenizer = self.tokenizer  # splits whole rows, to find the columns from the headings
         self.filepath = filepath
+        self.metrics = metrics
+        self.error_budget = error_budget
+        self.quarantine = quarantine
+        self._follow = None
+        self._row_index = None  # the RowIndex last used by read_rows or read_key_range
+        self._cache_counts = None  # the hits and misses of each conversion cache at the start of the read
+        self._reset_counts()
+        self.data =None
+
+    def _reset_counts(self):
         self.null_count = [0]*self.num_fields
         self.error_count = [0]*self.num_fields
-        self.data =None
+
+    def _start_read(self, text=None, encoding="utf-8"):
+        """
+        resets the counts at the start of a read, and if fields are bound by name finds their columns
+        from the heading row of the file (read with the encoding given) or of the text given
+        """
+        self._reset_counts()
+        if self.metrics is not None:
+            self._cache_counts = dict((name, (cache.hits, cache.misses)) for name, cache in self.schema.caches.items())
+        if not self.by_name:
+            return
+        if text is not None:
+            self._bind_columns(_TextReader(text))
+        else:
+            with self._open_stream(encoding) as data_file:
+                self._bind_columns(data_file)
+
+    def _bind_columns(self, data_file):
+        """reads the heading row from an open file, and binds the fields to the columns with their names"""
+        for i, headings in enumerate(self._heading_tokenizer.iter_rows(data_file, BLOCK_SIZE)):
+            if i == self.metadata.heading_row:
+                self._bind_headings(headings)
+                return
+        self._bind_headings([])
+
+    def _bind_headings(self, headings):
+        """binds each field to the first column headed by its name, using a tokenizer splitting out just those"""
+        names = [field.name for field in self.fields]
+        missing = [name for name in names if name not in headings]
+        if missing:
+            raise CsvReadError("WrongDataHeadings", {"headings": headings, "fields": names, "missing": missing})
+        self.columns = tuple(headings.index(name) for name in names)
+        self.tokenizer = make_tokenizer(self.metadata, self.columns)
 
     def choose_file_in_dir(self, directory):
         """Terminal prompt:
@@ -163,36 +797,707 @@ class CsvFile:
         print("Thank you - you have selected the data file:", filename)
         self.filepath = os.path.join(directory, filename)
 
-    def read_file(self):
+    def read_file(self, use_mmap=False, encoding="utf-8", workers=None, chunk_size=CHUNK_SIZE, where=None):
         """
         takes a csv file 'text' and a description of the file of type FileSettings
         checks the text is compatible with the described file type
         returns a 2d list representing the data stored in the csv file,
         (a list of the rows in the csv table)
+        :param use_mmap: if true the file is memory mapped rather than read into a string,
+         row and cell borders are found in the mapped bytes and only the cells of the labelled
+         columns are decoded (the encoding must be ascii compatible, such as utf-8 or latin-1).
+         Compressed files cannot be mapped, so they are decompressed and read as usual instead
+        :param encoding: the encoding of the file
+        :param workers: if given the rows are split and converted in chunks by this many worker processes
+         (0 for one per cpu), the results are identical to reading the file in a single process
+        :param chunk_size: the number of rows in each chunk sent to a worker process
+        :param where: a dictionary mapping field names to predicates on their converted values,
+         only rows passing every predicate are kept and counted (see compile_converter).
+         When reading in parallel the predicates must be picklable, e.g. functions defined at module level
+        """
+        start = time.perf_counter() if self.metrics is not None else None
+        if self.tokenizer.quoting and (use_mmap or workers is not None):
+            raise ValueError("files with quoted cells can only be read in a single process without use_mmap")
+        if workers is not None:
+            if use_mmap:
+                raise ValueError("use_mmap cannot be combined with parallel reading")
+            self._read_parallel(workers, chunk_size, where=where, encoding=encoding)
+            if self.metrics is not None:
+                self._report_read("parallel", start, len(self.data))
+            return
+        if use_mmap and compression(self.filepath) is None:
+            self._start_read(encoding=encoding)
+            convert_row = self._converter(where)
+            null_count, error_count = self.null_count, self.error_count
+            with self._map_file() as buffer:
+                split_rows = self._iter_mapped_rows(buffer, encoding)
+                data = [convert_row(row, null_count, error_count) for row in self._iter_data_rows(split_rows)]
+                self.data = [row for row in data if row is not None] if None in data else data
+                size = len(buffer)
+            if self.metrics is not None:
+                self._report_read("mmap", start, len(self.data), size)
+            return
+        text = self._open_file(encoding)
+        if self.metrics is not None:
+            self._report_stage("open", start, len(text))
+        self.read_contents(text, where)
+        if self.metrics is not None:
+            self._report_read("read_file", start, len(self.data), report_stage=False)
+
+    def iter_rows(self, block_size=BLOCK_SIZE, where=None):
+        """
+        generator reading the file incrementally rather than loading it into memory in one go;
+        the heading and unit rows are checked as they are reached and each data row is yielded
+        once it has been converted to the types given by the fields.
+        null_count and error_count are updated as the file is read
+        :param block_size: the number of characters to read from the file at a time
+        :param where: a dictionary mapping field names to predicates, only rows passing them all are yielded
+        """
+        self._start_read()
+        convert_row = self._converter(where)
+        null_count, error_count = self.null_count, self.error_count
+        split_rows = self._iter_data_rows(self._iter_split_rows(block_size))
+        if self.metrics is None:
+            for row in split_rows:
+                row = convert_row(row, null_count, error_count)
+                if row is not None:
+                    yield row
+            return
+        start = time.perf_counter()
+        rows = 0
+        for row in split_rows:
+            row = convert_row(row, null_count, error_count)
+            if row is not None:
+                rows += 1
+                yield row
+        self._report_read("iter_rows", start, rows)
+
+    def iter_batches(self, size, block_size=BLOCK_SIZE, where=None):
+        """
+        generator reading the file incrementally, yielding lists of up to 'size' converted data rows
+        :param size: the maximum number of rows in each batch
+        :param block_size: the number of characters to read from the file at a time
+        :param where: a dictionary mapping field names to predicates, only rows passing them all are yielded
+        """
+        if size < 1:
+            raise ValueError("batch size must be at least 1")
+        batch = []
+        for row in self.iter_rows(block_size, where):
+            batch.append(row)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def read_columns(self, block_size=BLOCK_SIZE, use_numpy=None):
+        """
+        reads the file incrementally, converting the cells straight into typed columns
+        rather than a list of rows; the result is stored in self.data and returned
+        :param block_size: the number of characters to read from the file at a time
+        :param use_numpy: whether to return numpy arrays, by default they are used if numpy is installed
+        :return: a ColumnData object, with a Column for each field
+        """
+        start = time.perf_counter() if self.metrics is not None else None
+        self._start_read()
+        builder = ColumnBuilder(self.fields)
+        convert_row = self._guard(builder.compile_converter(self.metadata, self.schema.caches))
+        null_count, error_count = self.null_count, self.error_count
+        for row in self._iter_data_rows(self._iter_split_rows(block_size)):
+            convert_row(row, null_count, error_count)
+        self.data = builder.finish(use_numpy)
+        if self.metrics is not None:
+            self._report_read("read_columns", start, self.data.length)
+        return self.data
+
+    def build_index(self, every=INDEX_EVERY, key=None, encoding="utf-8", save=True):
+        """
+        builds a RowIndex of the file, holding the byte offset of every 'every'th data row and, if a key field
+        is given, the least and greatest value of the key in each block of rows, for use by read_rows and
+        read_key_range. The heading and unit rows are checked as they are passed
+        :param key: the name of the key field, such as "yyyy", or None
+        :param encoding: the encoding of the file (which must be ascii compatible, such as utf-8 or latin-1)
+        :param save: if true the index is also written to a sidecar file next to the csv file (see index.py),
+         so it is used by later reads until the file changes
+        :return: the RowIndex
+        """
+        if every < 1:
+            raise ValueError("there must be at least one row in each block of the index")
+        self._check_indexable()
+        key_index = column_indexes(key, self.fields)[0] if key is not None else None
+        convert_key = compile_converter([self.fields[key_index]], self.metadata) if key is not None else None
+        counts = [0], [0]
+        self._start_read()
+        stat = os.stat(self.filepath)
+        metadata = self.metadata
+        row_border = _bytes_pattern(metadata.row_border)
+        split_cells = self.tokenizer.split_cells
+        offsets = []
+        blocks = [] if key is not None else None
+        i = 0  # the number of the row, counting from the first non blank row
+        blank_offsets = None  # the offsets of the blank rows since the last non blank row, None until there is one
+        with self._map_file() as buffer:
+            start = 0
+            length = len(buffer)
+            while start <= length:
+                border = row_border.search(buffer, start)
+                end = border.start() if border else length
+                text = self._remove_markers(buffer[start:end].decode(encoding)).strip()
+                if not text:
+                    if blank_offsets is not None:
+                        blank_offsets.append(start)
+                else:
+                    rows = [(offset, "") for offset in blank_offsets or ()] + [(start, text)]
+                    blank_offsets = []
+                    for offset, text in rows:
+                        if i < metadata.data_row:
+                            if i == metadata.heading_row:
+                                self._check_heading_cells(split_cells(text))
+                            if i == metadata.unit_row:
+                                self._check_unit_cells(split_cells(text))
+                        else:
+                            if (i - metadata.data_row) % every == 0:
+                                offsets.append(offset)
+                                if key is not None:
+                                    blocks.append((None, None))
+                            if key is not None:
+                                cells = split_cells(text) if text else [""]
+                                cell = cells[key_index] if key_index < len(cells) else ""
+                                value = convert_key([cell], *counts)[0]
+                                if value is not None:
+                                    least, greatest = blocks[-1]
+                                    if least is None or value < least:
+                                        least = value
+                                    if greatest is None or value > greatest:
+                                        greatest = value
+                                    blocks[-1] = (least, greatest)
+                        i += 1
+                if border is None:
+                    break
+                start = border.end()
+        if i < metadata.data_row:
+            self._check_missing_rows(i)
+        index = RowIndex(os.path.abspath(self.filepath), stat.st_size, stat.st_mtime_ns, every, offsets,
+                         max(i - metadata.data_row, 0), key, blocks, self._index_settings(key, encoding))
+        if save:
+            index.save()
+        self._row_index = index
+        return index
+
+    def read_rows(self, start, stop, where=None, encoding="utf-8"):
+        """
+        reads the data rows numbered from start up to (but not including) stop, numbered from 0 as in
+        self.data after read_file when no rows are left out. Only the blocks of the file holding the rows are
+        read, found from the file's index, which is built (and saved) first if there is no current one.
+        The result is stored in self.data and returned, null_count and error_count count the rows read
+        :param where: a dictionary mapping field names to predicates, only rows passing them all are kept
+        :param encoding: the encoding of the file
+        """
+        if start < 0 or stop < 0:
+            raise ValueError("rows are numbered from 0, counting from the first data row")
+        index = self._current_index(None, encoding)
+        return self._read_runs(index, index.runs(start, stop), where, encoding, "read_rows")
+
+    def read_key_range(self, key, low, high, where=None, encoding="utf-8"):
         """
-        text = self._open_file()
-        self.read_contents(text)
+        reads the data rows whose value of the key field is from low to high (inclusive), in the order they
+        are in the file. Only the blocks of rows the file's index shows may hold such values are read, the index
+        is built (and saved) first if there is no current index of this key.
+        The result is stored in self.data and returned, null_count and error_count count the rows read
+        :param key: the name of the key field, e.g. "yyyy"
+        :param where: a dictionary mapping field names to predicates, only rows passing them all are kept
+        :param encoding: the encoding of the file
+        """
+        index = self._current_index(key, encoding)
+        where = dict(where or {})
+        test = where.get(key)
+        if test is None:
+            where[key] = lambda value: low <= value <= high
+        else:
+            where[key] = lambda value: low <= value <= high and test(value)
+        return self._read_runs(index, index.key_runs(low, high), where, encoding, "read_key_range")
+
+    def _check_indexable(self):
+        if self.tokenizer.quoting:
+            raise ValueError("files with quoted cells cannot be indexed")
+        if compression(self.filepath) is not None:
+            raise ValueError("compressed files cannot be indexed")
 
-    def read_contents(self, text):
-        text = self._remove_markers(text)
-        data, rows = self._split_strip(text)
+    def _index_settings(self, key, encoding):
+        """describes how the file is read, an index built one way is not used to read the file another way"""
+        metadata = self.metadata
+        settings = (metadata.cell_border.pattern, metadata.row_border.pattern, metadata.markers,
+                    metadata.heading_row, metadata.unit_row, metadata.data_row, encoding, self.columns)
+        if key is None:
+            return settings
+        field = self.fields[column_indexes(key, self.fields)[0]]
+        return settings + (field.name, field.type.regex)
+
+    def _current_index(self, key, encoding):
+        """
+        returns an index of the file (of the key, if one is given) which is still current, using the one last
+        used or the saved one if possible, or else building and saving a new one
+        """
+        self._check_indexable()
+        self._start_read()
+        def usable(index):
+            return index is not None and (key is None or index.key == key) and \
+                index.is_current(self._index_settings(index.key, encoding))
+
+        if usable(self._row_index):
+            return self._row_index
+        index = load_index(self.filepath)
+        if usable(index):
+            self._row_index = index
+            return index
+        index = self.build_index(key=key, encoding=encoding, save=False)
+        try:
+            index.save()
+        except (OSError, ValueError):
+            pass  # the index is still used by this CsvFile, it is just rebuilt by others
+        return index
+
+    def _read_runs(self, index, runs, where, encoding, mode):
+        """
+        reads and converts the data rows of each (first row, stop row, offset) run given by an index,
+        seeking to the block holding the first row of each run; the rows are stored in self.data and returned
+        """
+        start_time = time.perf_counter() if self.metrics is not None else None
+        self._start_read()
+        convert = compile_converter(self.fields, self.metadata, where, self.record, self.schema.caches) \
+            if where else self._convert
+        null_count, error_count = self.null_count, self.error_count
+        markers = self.metadata.markers
+        split_cells = self.tokenizer.split_cells
+        raw = self.quarantine is not None
+        data = []
+        try:
+            binary_file = open(self.filepath, "rb")
+        except OSError:
+            raise CsvReadError("FileUnopenable")
+        with binary_file:
+            for first, stop, offset in runs:
+                binary_file.seek(offset)
+                data_file = io.TextIOWrapper(binary_file, encoding)
+                convert_row = self._guard(convert, self.metadata.data_row + first)
+                number = first - first % index.every  # the number of the first row of the block
+                for line in self.tokenizer.iter_raw_rows(data_file, BLOCK_SIZE):
+                    if number >= stop:
+                        break
+                    if number >= first:
+                        text = line
+                        for char in markers:
+                            text = text.replace(char, "")
+                        text = text.strip()
+                        row = split_cells(text) if text else [""]
+                        if raw:
+                            row = raw_row(row, line)
+                        row = convert_row(row, null_count, error_count)
+                        if row is not None:
+                            data.append(row)
+                    number += 1
+                data_file.detach()  # leaving the file open for the next run
+        self.data = data
+        if self.metrics is not None:
+            self._report_read(mode, start_time, len(data), report_stage=False)
+        return data
+
+    def read_new(self, final=False, encoding="utf-8", block_size=BLOCK_SIZE):
+        """
+        follow mode, for files which are still being appended to: reads only the part of the file
+        written since the last call, converting each complete row in it. The heading and unit rows are
+        checked once, as they are first read; null_count and error_count keep counting across calls.
+        A last row without a row border after it is kept back until the rest of it is written.
+        :param final: if true the last row is taken to be complete, as the file has stopped growing
+        :param encoding: the encoding of the file
+        :param block_size: the number of bytes read from the file at a time
+        :return: a list of the new data rows, which are also appended to self.data
+        """
+        if self.tokenizer.quoting:
+            raise ValueError("files with quoted cells cannot be followed")
+        state = self._follow
+        if state is None:
+            if compression(self.filepath) is not None:
+                raise ValueError("compressed files cannot be followed")
+            state = self._follow = _FollowState(encoding, self._converter(None))
+            self._reset_counts()
+            if self.by_name:
+                self.tokenizer = self._heading_tokenizer  # until the heading row is read
+            self.data = []
+        new_rows = []
+        try:
+            data_file = open(self.filepath, "rb")
+        except OSError:
+            raise CsvReadError("FileUnopenable")
+        with data_file:
+            size = os.fstat(data_file.fileno()).st_size
+            if size < state.offset:
+                raise CsvReadError("FileTruncated", {"offset": state.offset, "size": size})
+            data_file.seek(state.offset)
+            while True:
+                block = data_file.read(block_size)
+                if not block:
+                    break
+                state.offset += len(block)
+                rows = self.tokenizer.split_rows(state.partial + state.decoder.decode(block))
+                state.partial = rows.pop()
+                for text in rows:
+                    self._follow_row(state, text, new_rows)
+        if final:
+            text = state.partial + state.decoder.decode(b"", final=True)
+            state.partial = ""
+            self._follow_row(state, text, new_rows)
+        self.data.extend(new_rows)
+        return new_rows
+
+    def follow(self, interval=1.0, idle_timeout=None, encoding="utf-8"):
+        """
+        generator polling a growing file every 'interval' seconds, yielding a list of the new data rows
+        whenever any have been written (see read_new)
+        :param idle_timeout: if given, stop once no new rows have been written for this many seconds,
+         first yielding the last row if it has no row border after it (see read_new's final argument)
+        """
+        idle = 0.0
+        while True:
+            rows = self.read_new(encoding=encoding)
+            if rows:
+                idle = 0.0
+                yield rows
+            else:
+                if idle_timeout is not None and idle >= idle_timeout:
+                    rows = self.read_new(final=True, encoding=encoding)
+                    if rows:
+                        yield rows
+                    return
+                time.sleep(interval)
+                idle += interval
+
+    def reset_follow(self):
+        """forgets the position reached by read_new, so the next call reads the file from the beginning"""
+        self._follow = None
+
+    def _follow_row(self, state, text, new_rows):
+        """
+        handles one complete row read in follow mode: checking it if it is a heading or unit row,
+        or converting it and adding it to new_rows if it is a data row
+        """
+        line = text
+        text = self._remove_markers(text).strip()
+        if not text:
+            if state.blank_rows is not None:
+                state.blank_rows += 1
+            return
+        texts = [("", "")]*(state.blank_rows or 0)
+        texts.append((text, line))
+        state.blank_rows = 0
+        metadata = self.metadata
+        for text, line in texts:
+            i = state.rows
+            state.rows += 1
+            if i == metadata.heading_row and self.by_name:
+                self._bind_headings(self._heading_tokenizer.split_cells(text))
+            row = self.tokenizer.split_cells(text)
+            if i >= metadata.data_row:
+                if self.quarantine is not None:
+                    row = raw_row(row, line)
+                row = state.convert_row(row, self.null_count, self.error_count)
+                if row is not None:
+                    new_rows.append(row)
+            elif i == metadata.heading_row:
+                self._check_heading_cells(row)
+            elif i == metadata.unit_row:
+                self._check_unit_cells(row)
+
+    def _read_parallel(self, workers, chunk_size, block_size=BLOCK_SIZE, where=None, encoding="utf-8"):
+        """
+        reads the file with a pool of worker processes: the heading rows are checked here,
+        the remaining rows are split on the row border into chunks of 'chunk_size' rows which are
+        converted by the workers, and the results are merged back in order.
+        At most two chunks per worker are in flight at a time, so memory use stays bounded
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk size must be at least 1")
+        if self.error_budget is not None or self.quarantine is not None:
+            raise ValueError("an error budget or quarantine cannot be used with parallel reading")
+        self._start_read(encoding=encoding)
+        metadata = self.metadata
+        raw_rows = self._iter_raw_rows(block_size, encoding)
+        data = []
+        seen_data = self._check_leading_rows(raw_rows)
+        pending_blanks = 0
+        caches = self.schema.caches
+        convert = compile_converter(self.fields, metadata, where, self.record, caches)
+        records = self.record is not None
+
+        def merge(first_row, future):
+            nonlocal seen_data, pending_blanks
+            leading, rows, trailing, null_count, error_count, cache_counts = future.result()
+            for name, (hits, misses) in cache_counts.items():
+                # the lookups made by the workers are counted against the caches of the schema
+                caches[name].hits += hits
+                caches[name].misses += misses
+            if trailing is None:
+                pending_blanks += leading
+                return
+            if seen_data:
+                # the blank rows just before the first row of this chunk holding data
+                convert_row = guard_converter(convert, self.fields, first_row - pending_blanks)
+                for _ in range(pending_blanks + leading):
+                    row = convert_row([""], self.null_count, self.error_count)
+                    if row is not None:
+                        data.append(row)
+            data.extend(rows)
+            seen_data = True
+            pending_blanks = trailing
+            for j in range(self.num_fields):
+                self.null_count[j] += null_count[j]
+                self.error_count[j] += error_count[j]
+
+        def submit(chunk, first_row):
+            future = executor.submit(_convert_chunk, metadata, self.fields, chunk, where, records, first_row,
+                                     self.columns, self.schema.memoize)
+            in_flight.append((first_row, future))
+
+        workers = workers or os.cpu_count() or 1
+        in_flight = deque()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            try:
+                chunk = []
+                next_row = metadata.data_row  # the number of the first row of the next chunk
+                started = seen_data
+                for text in raw_rows:
+                    if not started:
+                        if not self._remove_markers(text).strip():
+                            continue  # blank rows at the start of the file are not numbered
+                        started = True
+                    chunk.append(text)
+                    if len(chunk) == chunk_size:
+                        submit(chunk, next_row)
+                        next_row += chunk_size
+                        chunk = []
+                        if len(in_flight) >= 2*workers:
+                            merge(*in_flight.popleft())
+                if chunk:
+                    submit(chunk, next_row)
+                while in_flight:
+                    merge(*in_flight.popleft())
+            finally:
+                for _, future in in_flight:
+                    future.cancel()
+        self.data = data
+
+    def _check_leading_rows(self, raw_rows):
+        """
+        takes rows from an iterator of raw row texts up to the first data row,
+        checking the heading and unit rows as they are passed.
+        returns true if any rows were taken (after the blank rows at the start of the file)
+        """
+        metadata = self.metadata
+        split_cells = self.tokenizer.split_cells
+        i = 0
+        while i < metadata.data_row:
+            text = next(raw_rows, None)
+            if text is None:
+                self._check_missing_rows(i)
+                break
+            text = self._remove_markers(text).strip()
+            if not text and i == 0:
+                continue
+            row = split_cells(text)
+            if i == metadata.heading_row:
+                self._check_heading_cells(row)
+            if i == metadata.unit_row:
+                self._check_unit_cells(row)
+            i += 1
+        return i > 0
+
+    def read_contents(self, text, where=None):
+        metrics = self.metrics
+        start = time.perf_counter() if metrics is not None else None
+        self._start_read(text)
+        size = len(text)
+        if self.quarantine is not None:
+            # the text of each row is kept with its cells, for recording bad rows
+            data = list(self.tokenizer.iter_rows(io.StringIO(text), BLOCK_SIZE, raw=True))
+            rows = len(data)
+        else:
+            text = self._remove_markers(text)
+            if metrics is not None:
+                start = self._report_stage("remove_markers", start, size)
+            data, rows = self._split_strip(text)
+        if metrics is not None:
+            start = self._report_stage("split_strip", start, len(text), rows)
         self._check_headings(data)
-        data = self._check_type(data, rows)
+        if metrics is not None:
+            start = self._report_stage("check_headings", start)
+        data = self._check_type(data, rows, where)
+        if metrics is not None:
+            start = self._report_stage("check_type", start, rows=rows - self.metadata.data_row)
         data = self._trim(data)
+        if metrics is not None:
+            self._report_stage("trim", start, rows=len(data))
         self.data =data
 
-    def _open_file(self):
+    def _report_stage(self, name, start, size=None, rows=None):
+        """tells the metrics object the time taken by a stage begun at 'start', returns the time now"""
+        now = time.perf_counter()
+        self.metrics.on_stage(name, now - start, size, rows)
+        return now
+
+    def _report_read(self, mode, start, rows, size=None, report_stage=True):
+        """
+        tells the metrics object the statistics of a read begun at 'start',
+        reads whose stages are interleaved are also reported as a single stage named after the mode
+        """
+        seconds = time.perf_counter() - start
+        if report_stage:
+            if size is None and self.filepath is not None:
+                size = os.path.getsize(self.filepath)
+            self.metrics.on_stage(mode, seconds, size, rows)
+        names = [field.name for field in self.fields]
+        self.metrics.on_read({
+            "mode": mode,
+            "path": self.filepath,
+            "seconds": seconds,
+            "tokenizer": self.tokenizer.name,
+            "rows": rows,
+            "cells": rows * self.num_fields,
+            "null_count": dict(zip(names, self.null_count)),
+            "error_count": dict(zip(names, self.error_count)),
+            "cache": self._cache_stats(),
+        })
+
+    def _cache_stats(self):
+        """returns the hits, misses and hit rate of each conversion cache since the start of the read"""
+        stats = {}
+        for name, cache in self.schema.caches.items():
+            hits, misses = cache.hits, cache.misses
+            if self._cache_counts is not None and name in self._cache_counts:
+                hits -= self._cache_counts[name][0]
+                misses -= self._cache_counts[name][1]
+            lookups = hits + misses
+            stats[name] = {"hits": hits, "misses": misses, "hit_rate": hits / lookups if lookups else None}
+        return stats
+
+    def _open_file(self, encoding="utf-8"):
         """
         opens a file, reads it and closes it
         returns an object of type file
         """
+        with open_text(self.filepath, encoding) as data_file:
+            return data_file.read()
+
+    def _open_stream(self, encoding="utf-8"):
+        """
+        opens the file for reading, returns an open file object
+        (decompressing the file as it is read if it is compressed)
+        """
+        return open_text(self.filepath, encoding)
+
+    def _iter_raw_rows(self, block_size, encoding="utf-8"):
+        """
+        generator reading the file incrementally and splitting it on the row border,
+        yields the text of each row in turn
+        """
+        with self._open_stream(encoding) as data_file:
+            for text in self.tokenizer.iter_raw_rows(data_file, block_size):
+                yield text
+
+    def _iter_data_rows(self, split_rows):
+        """
+        generator taking the split cells of each row in the file and yielding those of the data rows,
+        the heading and unit rows are checked as they are passed (or when the file ends before them)
+        """
+        metadata = self.metadata
+        i = 0
+        for row in split_rows:
+            if i >= metadata.data_row:
+                yield row
+                continue
+            if i == metadata.heading_row:
+                self._check_heading_cells(row)
+            if i == metadata.unit_row:
+                self._check_unit_cells(row)
+            i += 1
+        self._check_missing_rows(i)
+
+    def _iter_split_rows(self, block_size):
+        """
+        generator splitting each row of the file into a list of stripped cells,
+        blank rows at the beginning and end of the file are dropped in the same
+        way as stripping the whole text does in _split_strip
+        """
+        with self._open_stream() as data_file:
+            for row in self.tokenizer.iter_rows(data_file, block_size, self.quarantine is not None):
+                yield row
+
+    def _map_file(self):
+        """
+        memory maps the file read only, returns a context manager giving the mapped bytes
+        (or an empty bytes object for an empty file, which cannot be mapped)
+        """
         try:
-            data_file = open(self.filepath, "r")
+            with open(self.filepath, "rb") as data_file:
+                if os.fstat(data_file.fileno()).st_size == 0:
+                    return _EmptyMap()
+                return mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
         except OSError:
             raise CsvReadError("FileUnopenable")
-        text = data_file.read()
-        data_file.close()
-        return text
+
+    def _iter_mapped_rows(self, buffer, encoding):
+        """
+        generator finding the rows and cells of a memory mapped file without copying it,
+        yields a list of the stripped cells of each row, only the cells of the labelled columns
+        (or of the columns bound by name) are decoded.
+        Rows are stripped and blank rows dropped in the same way as by _iter_split_rows
+        """
+        metadata = self.metadata
+        row_border = _bytes_pattern(metadata.row_border)
+        cell_border = _bytes_pattern(metadata.cell_border)
+        strip_chars = "\\s" + re.escape(metadata.markers)
+        row_start = re.compile(("[^" + strip_chars + "]").encode())
+        row_end = re.compile(("[" + strip_chars + "]*\\Z").encode())
+        markers = metadata.markers
+        columns = self.columns if self.by_name else None
+        width = max(columns) + 1 if columns is not None else self.num_fields
+        raw = self.quarantine is not None  # if true the text of each row is kept with its cells, see RawRow
+        blank_rows = None  # the (start, end) of the blank rows since the last row containing data
+        start = 0
+        length = len(buffer)
+        while start <= length:
+            border = row_border.search(buffer, start)
+            end = border.start() if border else length
+            first = row_start.search(buffer, start, end)
+            if first is None:
+                if blank_rows is not None:
+                    blank_rows.append((start, end))
+            else:
+                if blank_rows:
+                    for blank_start, blank_end in blank_rows:
+                        yield raw_row([""], buffer[blank_start:blank_end].decode(encoding)) if raw else [""]
+                blank_rows = []
+                last = row_end.search(buffer, first.start(), end).start()
+                cells = []
+                cell_start = first.start()
+                for match in cell_border.finditer(buffer, cell_start, last):
+                    cells.append(buffer[cell_start:match.start()])
+                    cell_start = match.end()
+                    if len(cells) == width:
+                        break
+                else:
+                    cells.append(buffer[cell_start:last])
+                if columns is not None:
+                    cells = [cells[i] for i in columns if i < len(cells)]
+                row = []
+                for cell in cells:
+                    cell = cell.decode(encoding)
+                    for char in markers:
+                        cell = cell.replace(char, "")
+                    row.append(cell.strip())
+                yield raw_row(row, buffer[start:end].decode(encoding)) if raw else row
+            if border is None:
+                break
+            start = border.end()
 
     def _remove_markers(self, text):
         """ strip out asterics and hashes from the file"""
@@ -205,15 +1510,8 @@ class CsvFile:
         split the data into a 2D list and strip out whitespace,
         returns a 2D list of data and an integer representing the number of rows in this data
         """
-        text = text.strip()
-        data = self.metadata.row_border.split(text)
-        rows = len(data)
-        for i in range(rows):
-            data[i] = data[i].strip()
-            data[i] = self.metadata.cell_border.split(data[i])
-            for j in range(len(data[i])):
-                data[i][j] = data[i][j].strip()
-        return data, rows
+        data = self.tokenizer.split_text(text)
+        return data, len(data)
 
     def _check_headings(self, data):
         """
@@ -222,17 +1520,35 @@ class CsvFile:
         """
         heading_row = self.metadata.heading_row
         unit_row=self.metadata.unit_row
-        if heading_row is not None:
-            headings= data[heading_row]
-            fields =[field.name for field in self.fields]
-            if not fields == headings[:self.num_fields]:
-                raise CsvReadError("WrongDataHeadings", {"headings":headings,"fields": fields})
-        if unit_row is not None:
-            units= data[heading_row]
-            if not [field.units for field in self.fields] == units[:self.num_fields]:
-                raise CsvReadError("WrongDataUnits", units)
-
-    def _check_type(self, data, rows):
+        if heading_row is not None and heading_row < len(data):
+            self._check_heading_cells(data[heading_row])
+        if unit_row is not None and unit_row < len(data):
+            self._check_unit_cells(data[unit_row])
+        self._check_missing_rows(len(data))
+
+    def _check_missing_rows(self, rows):
+        """
+        checks the heading and unit rows of a file which has only 'rows' rows, a heading or unit row
+        the file ends before is checked as an empty row, raising a WrongDataHeadings or WrongDataUnits error
+        """
+        metadata = self.metadata
+        if metadata.heading_row is not None and rows <= metadata.heading_row:
+            self._check_heading_cells([""])
+        if metadata.unit_row is not None and rows <= metadata.unit_row:
+            self._check_unit_cells([""])
+
+    def _check_heading_cells(self, headings):
+        """checks a list of headings read from the file matches the names of the fields"""
+        fields =[field.name for field in self.fields]
+        if not fields == headings[:self.num_fields]:
+            raise CsvReadError("WrongDataHeadings", {"headings":headings,"fields": fields})
+
+    def _check_unit_cells(self, units):
+        """checks a list of units read from the file matches the units of the fields"""
+        if not [field.units for field in self.fields] == units[:self.num_fields]:
+            raise CsvReadError("WrongDataUnits", units)
+
+    def _check_type(self, data, rows, where=None):
         """
         Takes a 2d list of data, a description of the data of type FileSettings,
         and the number of rows in the data.
@@ -242,32 +1558,43 @@ class CsvFile:
         and a count of any unreadable values in the csv file.
         """
 
-        fields = self.fields
-        types = self.metadata.types
-        empty_cell = self.metadata.empty_cell
-        data_row = self.metadata.data_row
-
-        for i in range(data_row, rows):
-            for j in range(self.num_fields):
-                if not fields[j].type.check(data[i][j]):
-                    if empty_cell.match(data[i][j]):
-                        self.null_count[j] += 1
-                    else:
-                        self.error_count[j] += 1
-                    data[i][j] = None
-                else:
-                     data[i][j] = fields[j].type.convert(data[i][j])
+        convert_row = self._converter(where)
+        null_count, error_count = self.null_count, self.error_count
+        for i in range(self.metadata.data_row, rows):
+            data[i] = convert_row(data[i], null_count, error_count)
         return data
 
+    def _converter(self, where):
+        """
+        returns the row converter for one read of the file, filtering rows with the predicates in where
+        if given, and dealing with bad rows as set by error_budget and quarantine
+        """
+        if where:
+            convert_row = compile_converter(self.fields, self.metadata, where, self.record, self.schema.caches)
+        else:
+            convert_row = self._convert
+        return self._guard(convert_row)
+
+    def _guard(self, convert_row, first_row=None):
+        """
+        wraps a row converter to deal with short rows and rows with unreadable cells (see guard_converter),
+        the rows are numbered from first_row, by default the data row of the file
+        """
+        if first_row is None:
+            first_row = self.metadata.data_row
+        return guard_converter(convert_row, self.fields, first_row, self.error_budget, self.quarantine,
+                               literal_text(self.metadata.cell_border) or ",", self.metadata.empty_cell)
+
     def _trim(self, data):
         """
          Takes a 2d list of data and description of the data of class Labels
-         if any of the rows are longer than the number of labled columns the aditional cells are deleted
+         if any of the rows are longer than the number of labled columns the aditional cells are deleted,
+         rows dropped by predicates (left as None by _check_type) are removed
          returns the trimmed data
          """
+        # the converted rows hold only the labelled columns already, so they are kept rather than copied
         del data[:self.metadata.data_row]
-        rows = len(data)
-        for i in range(rows):
-            data[i] = data[i][:self.num_fields]
+        if None in data:
+            return [row for row in data if row is not None]
         return data
 
@@ -0,0 +1,99 @@
+"""
+Loading csv files into Django models.
+Django is only imported when a loader is used, so the rest of the package works without it.
+"""
+
+from .csvReader2 import CsvReadError
+
+BATCH_SIZE = 1000  # rows saved by each call to bulk_create
+
+
+class ModelLoader:
+    """
+    Streams the rows of a CsvFile into a Django model with bulk_create,
+    each field of the file being stored in the model field of the same name (unless mapped otherwise)
+    """
+    def __init__(self, model, fields, field_map=None, extra=None, batch_size=BATCH_SIZE,
+                 using=None, single_transaction=False):
+        """
+        :param model: the Django model class to create objects of
+        :param fields: the list of Field objects describing the file
+        :param field_map: a dictionary mapping field names to model field names,
+         a field mapped to None is not stored
+        :param extra: a dictionary of values given to every object created, e.g. a foreign key
+        :param batch_size: the number of objects created by each call to bulk_create
+        :param using: the alias of the database to load into
+        :param single_transaction: if true the whole file is loaded in one transaction,
+         otherwise each batch is committed in its own transaction
+        """
+        if batch_size < 1:
+            raise ValueError("batch size must be at least 1")
+        self.model = model
+        self.batch_size = batch_size
+        self.using = using
+        self.single_transaction = single_transaction
+        self.extra = extra or {}
+        field_map = field_map or {}
+        self.columns = []
+        missing = []
+        for i, field in enumerate(fields):
+            name = field_map.get(field.name, field.name)
+            if name is None:
+                continue
+            if not _has_field(model, name):
+                missing.append(name)
+            self.columns.append((i, name))
+        if missing:
+            raise CsvReadError("WrongModelFields", {"model": model.__name__, "fields": missing})
+
+    def load(self, csv_file):
+        """
+        reads csv_file a batch at a time and creates a model object for each row
+        :return: the number of objects created
+        """
+        from django.db import transaction
+
+        if self.single_transaction:
+            with transaction.atomic(using=self.using):
+                return self._load_batches(csv_file, None)
+        return self._load_batches(csv_file, transaction.atomic)
+
+    def _load_batches(self, csv_file, batch_atomic):
+        """creates the objects a batch at a time, wrapping each batch in batch_atomic if it is given"""
+        model = self.model
+        columns = self.columns
+        extra = self.extra
+        manager = model._default_manager.db_manager(self.using) if self.using else model._default_manager
+        created = 0
+        for batch in csv_file.iter_batches(self.batch_size):
+            objects = []
+            for row in batch:
+                values = dict(extra)
+                for i, name in columns:
+                    values[name] = row[i]
+                objects.append(model(**values))
+            if batch_atomic is None:
+                manager.bulk_create(objects, batch_size=self.batch_size)
+            else:
+                with batch_atomic(using=self.using):
+                    manager.bulk_create(objects, batch_size=self.batch_size)
+            created += len(objects)
+        return created
+
+
+def bulk_load(model, csv_file, **kwargs):
+    """
+    loads the rows of csv_file into a Django model, see ModelLoader for the keyword arguments
+    :return: the number of objects created
+    """
+    return ModelLoader(model, csv_file.fields, **kwargs).load(csv_file)
+
+
+def _has_field(model, name):
+    from django.core.exceptions import FieldDoesNotExist
+
+    try:
+        model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
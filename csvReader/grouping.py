@@ -0,0 +1,116 @@
+"""
+Grouping and indexing of parsed data (a list of rows, as read by CsvFile.read_file).
+These replace csvReader.split_by_values, working on any column (or tuple of columns) and any
+type of value, and returning the number of rejected rows instead of printing it.
+
+Columns may be given by index, or by name if the list of fields is passed too.
+"""
+
+from bisect import bisect_left, bisect_right
+
+
+def column_indexes(columns, fields=None):
+    """
+    returns a tuple of column indexes, from a column or tuple of columns given by index or field name
+    """
+    if not isinstance(columns, (tuple, list)):
+        columns = (columns,)
+    names = [field.name for field in fields] if fields is not None else []
+    indexes = []
+    for column in columns:
+        if isinstance(column, int):
+            indexes.append(column)
+        elif column in names:
+            indexes.append(names.index(column))
+        else:
+            raise ValueError(str(column) + " is not a valid column")
+    return tuple(indexes)
+
+
+def _key_function(columns, fields):
+    """returns a function giving the key of a row, and whether keys are tuples of several values"""
+    indexes = column_indexes(columns, fields)
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda row: row[index], False
+    return lambda row: tuple(row[i] for i in indexes), True
+
+
+def group_by(data, columns, fields=None):
+    """
+    Groups rows by the values in one or more columns in a single pass.
+    Rows with an empty (None) value in any of the key columns are rejected.
+
+    :param data: a list of rows
+    :param columns: the column to group by, or a tuple of columns
+    :param fields: the list of fields of the data, needed if columns are given by name
+    :return: a tuple (groups, rejected) where groups is a dictionary mapping each key
+     (a value, or a tuple of values for several columns) to the list of its rows in their original order,
+     and rejected is the number of rows left out
+    """
+    key, compound = _key_function(columns, fields)
+    groups = {}
+    rejected = 0
+    for row in data:
+        value = key(row)
+        if value is None or compound and None in value:
+            rejected += 1
+            continue
+        group = groups.get(value)
+        if group is None:
+            groups[value] = [row]
+        else:
+            group.append(row)
+    return groups, rejected
+
+
+class SortedIndex:
+    """
+    The rows of some data sorted by the values in one or more columns, for range queries with bisect,
+    e.g. SortedIndex(data, "yyyy", fields).between(1961, 1990).
+    Rows with an empty (None) value in any of the key columns are left out and counted in 'rejected'
+    """
+    def __init__(self, data, columns, fields=None):
+        key, compound = _key_function(columns, fields)
+        pairs = []
+        rejected = 0
+        for row in data:
+            value = key(row)
+            if value is None or compound and None in value:
+                rejected += 1
+            else:
+                pairs.append((value, row))
+        pairs.sort(key=lambda pair: pair[0])  # a stable sort, keeping rows with equal keys in order
+        self.keys = [pair[0] for pair in pairs]
+        self.rows = [pair[1] for pair in pairs]
+        self.rejected = rejected
+
+    def __len__(self):
+        return len(self.rows)
+
+    def between(self, low=None, high=None, include_high=True):
+        """
+        returns the rows whose keys lie between low and high (either may be None for no limit),
+        low is included, high is included unless include_high is false
+        """
+        start, stop = self._bounds(low, high, include_high)
+        return self.rows[start:stop]
+
+    def equal(self, value):
+        """returns the rows whose key equals value"""
+        return self.rows[bisect_left(self.keys, value):bisect_right(self.keys, value)]
+
+    def count(self, low=None, high=None, include_high=True):
+        """returns the number of rows whose keys lie between low and high, without copying them"""
+        start, stop = self._bounds(low, high, include_high)
+        return stop - start
+
+    def _bounds(self, low, high, include_high):
+        start = 0 if low is None else bisect_left(self.keys, low)
+        if high is None:
+            stop = len(self.keys)
+        elif include_high:
+            stop = bisect_right(self.keys, high)
+        else:
+            stop = bisect_left(self.keys, high)
+        return start, max(start, stop)
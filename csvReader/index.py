@@ -0,0 +1,148 @@
+"""
+Sidecar indexes of the rows of csv files, so a range of rows (or the rows of a range of key values)
+can be read by seeking to them rather than parsing the whole file:
+
+    csv_file.read_rows(500000, 500100)
+    csv_file.read_key_range("yyyy", 1990, 1990)
+
+The index is built by CsvFile.build_index and kept in a JSON file next to the csv file (its path with SUFFIX
+added), which is ignored once the csv file's size or modification time changes.
+"""
+
+import json
+import os
+import tempfile
+from datetime import date
+
+INDEX_EVERY = 1000  # data rows in each block of a RowIndex
+SUFFIX = ".idx"  # added to the path of a csv file to give the path of its index
+
+
+class RowIndex:
+    """
+    The byte offset of the first row of each block of 'every' data rows of a file (the data rows being numbered
+    from 0, as in CsvFile.data when no rows are left out), the number of data rows, and, when a key field is
+    given, a list 'blocks' of the least and greatest value of the key in each block ((None, None) if it has none).
+    'settings' describes how the file was read when the index was built, an index is only used to read the file
+    the same way, and only while the file has the size and modification time it had then
+    """
+    def __init__(self, path, size, mtime_ns, every, offsets, rows, key=None, blocks=None, settings=None):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.every = every
+        self.offsets = offsets
+        self.rows = rows
+        self.key = key
+        self.blocks = blocks
+        self.settings = _plain(settings)
+
+    def is_current(self, settings=None):
+        """returns true if the file is unchanged since the index was built (and read with the settings given)"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        if stat.st_size != self.size or stat.st_mtime_ns != self.mtime_ns:
+            return False
+        return settings is None or _plain(settings) == self.settings
+
+    def runs(self, start, stop):
+        """
+        returns a list holding the (first row, stop row, byte offset of the block holding the first row)
+        of the rows from start up to stop, or an empty list if there are none
+        """
+        stop = min(stop, self.rows)
+        if start >= stop:
+            return []
+        return [(start, stop, self.offsets[start // self.every])]
+
+    def key_runs(self, low, high):
+        """
+        returns a list of the (first row, stop row, byte offset) of each run of consecutive blocks which may
+        hold key values from low to high (inclusive)
+        """
+        if self.key is None:
+            raise ValueError("the index has no key field")
+        runs = []
+        for number, (least, greatest) in enumerate(self.blocks):
+            if least is None or greatest < low or least > high:
+                continue
+            first = number * self.every
+            stop = min(first + self.every, self.rows)
+            if runs and runs[-1][1] == first:
+                runs[-1] = (runs[-1][0], stop, runs[-1][2])
+            else:
+                runs.append((first, stop, self.offsets[number]))
+        return runs
+
+    def save(self, index_path=None):
+        """
+        writes the index to its sidecar file (or to index_path), replacing any index already there.
+        Key values must be numbers, strings or dates, a ValueError is raised for others
+        """
+        if index_path is None:
+            index_path = sidecar_path(self.path)
+        content = {
+            "path": self.path, "size": self.size, "mtime_ns": self.mtime_ns, "every": self.every,
+            "offsets": self.offsets, "rows": self.rows, "key": self.key, "settings": self.settings,
+            "blocks": None if self.blocks is None else [[_encode(value) for value in block] for block in self.blocks]
+        }
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_path)), suffix=".tmp")
+        try:
+            with os.fdopen(handle, "w") as index_file:
+                json.dump(content, index_file)
+            os.replace(temp_path, index_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def sidecar_path(path):
+    """returns the path of the index of a csv file"""
+    return path + SUFFIX
+
+
+def load_index(path, settings=None, index_path=None):
+    """
+    returns the RowIndex saved for a csv file if it is still current (see RowIndex.is_current), or else None
+    :param path: the path of the csv file
+    :param settings: the settings the file is to be read with, an index built with others is not returned
+    :param index_path: the path of the index, by default its sidecar path
+    """
+    if index_path is None:
+        index_path = sidecar_path(path)
+    try:
+        with open(index_path) as index_file:
+            content = json.load(index_file)
+        blocks = content["blocks"]
+        if blocks is not None:
+            blocks = [tuple(_decode(value) for value in block) for block in blocks]
+        index = RowIndex(content["path"], content["size"], content["mtime_ns"], content["every"],
+                         content["offsets"], content["rows"], content["key"], blocks, content["settings"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if os.path.abspath(index.path) != os.path.abspath(path):
+        return None
+    return index if index.is_current(settings) else None
+
+
+def _plain(settings):
+    """returns settings as they are after being saved and loaded as JSON, with tuples turned into lists"""
+    return json.loads(json.dumps(settings))
+
+
+def _encode(value):
+    """returns a key value in a form which can be saved as JSON"""
+    if isinstance(value, date):
+        return {"date": value.isoformat()}
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    raise ValueError("key values of type " + type(value).__name__ + " cannot be saved in an index")
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        return date(*[int(part) for part in value["date"].split("-")])
+    return value
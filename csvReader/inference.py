@@ -0,0 +1,169 @@
+""" Guessing the layout and field types of an unknown csv file from a sample of its rows """
+
+import random
+import re
+from collections import Counter
+
+from .csvReader2 import CsvReadError, Field, MetaData, open_text
+
+SAMPLE_ROWS = 100
+DELIMITERS = [",", ";", "\t", r"\|", r"\s+"]  # candidate cell border regexes, tried in order of preference
+MARKER_CHARS = "*#"  # characters which may mark estimated values, as in Met Office station data
+TYPE_ORDER = ["date", "integer", "float", "full_date"]  # narrowest first, other types come after these
+NUMERIC = re.compile(r"-?[0-9]+\.?[0-9]*$")
+PLACEHOLDER = re.compile(r"[^0-9A-Za-z]*$")  # cells such as "---" standing in for missing values
+
+
+def infer_schema(path, sample_rows=SAMPLE_ROWS, reservoir=False, max_error_rate=0.05, seed=0):
+    """
+    Guesses the Field list and MetaData of a csv file without parsing the whole of it.
+    The head of the file is used to find the cell border, the heading, unit and data rows and any markers;
+    each column is then given the narrowest type from MetaData.types matching its sampled cells
+    (ignoring empty cells and placeholders such as "---").
+
+    :param path: the path of the file
+    :param sample_rows: the number of rows to read from the head of the file
+    :param reservoir: if true the types are also inferred from a reservoir sample of 'sample_rows' rows from
+     the rest of the file, which is read line by line without being held in memory
+    :param max_error_rate: the fraction of non-empty cells in a column which may fail to match its type,
+     so occasional unreadable values such as "---" do not force a column to the universal type
+    :param seed: the seed for the reservoir sample
+    :return: a tuple (fields, metadata)
+    """
+    head, sample = _read_sample(path, sample_rows, reservoir, seed)
+    if not head:
+        raise CsvReadError("NoData", path)
+    delimiter = _detect_delimiter(head)
+    cell_border = re.compile(delimiter)
+    split = lambda line: [cell.strip() for cell in cell_border.split(line.strip())]
+    rows = [split(line) for line in head]
+    markers = _detect_markers(rows)
+    rows = [[_remove(cell, markers) for cell in row] for row in rows]
+    width = Counter(len(row) for row in rows if len(row) > 1).most_common(1)[0][0] if any(
+        len(row) > 1 for row in rows) else 1
+
+    # the data rows are the run of numeric rows, as wide as the data, which the head of the file ends with;
+    # the heading and unit rows are the (at most two) rows of labels immediately above them,
+    # anything further up is taken to be a description of the file
+    data_row = len(rows)
+    while data_row > 0 and (_is_data(rows[data_row - 1]) and len(rows[data_row - 1]) == width
+                            or rows[data_row - 1] == [""]):
+        data_row -= 1
+    labels = []
+    for i in range(data_row - 1, max(data_row - 3, -1), -1):
+        if not 1 < len(rows[i]) <= width or _is_data(rows[i]):
+            break
+        labels.insert(0, i)
+    if labels and len(rows[labels[0]]) != width:
+        labels = labels[1:]
+    heading_row = labels[0] if labels else None
+    unit_row = labels[1] if len(labels) > 1 else None
+    units = [""]*width
+    if unit_row is not None:
+        # a unit row with fewer cells than the data (e.g. split on whitespace, with no units for
+        # the first columns) is lined up with the last columns, and is not checked when reading
+        units = [""]*(width - len(rows[unit_row])) + rows[unit_row]
+        if len(rows[unit_row]) != width:
+            unit_row = None
+
+    data_rows = rows[data_row:]
+    data_rows += [[_remove(cell, markers) for cell in split(line)] for line in sample]
+    metadata = MetaData(cell_border=delimiter, markers=markers, heading_row=heading_row,
+                        unit_row=unit_row, data_row=data_row)
+
+    names = rows[heading_row][:width] if heading_row is not None else \
+        ["column_{}".format(j + 1) for j in range(width)]
+    fields = []
+    for j in range(width):
+        cells = [row[j] for row in data_rows if j < len(row) and not PLACEHOLDER.match(row[j])]
+        fields.append(Field(names[j], _narrowest_type(cells, metadata.types, max_error_rate), units[j]))
+    return fields, metadata
+
+
+def _read_sample(path, sample_rows, reservoir, seed):
+    """
+    returns the first 'sample_rows' lines of the file (after any leading blank lines),
+    and if reservoir is true a reservoir sample of 'sample_rows' non-blank lines from the rest of the file
+    """
+    head = []
+    sample = []
+    with open_text(path) as data_file:
+        for line in data_file:
+            if not head and not line.strip():
+                continue
+            head.append(line.rstrip("\n"))
+            if len(head) == sample_rows:
+                break
+        if reservoir:
+            rng = random.Random(seed)
+            seen = 0
+            for line in data_file:
+                if not line.strip():
+                    continue
+                seen += 1
+                if len(sample) < sample_rows:
+                    sample.append(line.rstrip("\n"))
+                else:
+                    i = rng.randrange(seen)
+                    if i < sample_rows:
+                        sample[i] = line.rstrip("\n")
+    return head, sample
+
+
+def _detect_delimiter(lines):
+    """
+    returns the candidate cell border which splits the most lines into the same number (above one) of cells
+    """
+    best, best_score = DELIMITERS[0], None
+    for delimiter in DELIMITERS:
+        pattern = re.compile(delimiter)
+        counts = Counter(len(pattern.split(line.strip())) for line in lines if line.strip())
+        width, frequency = counts.most_common(1)[0] if counts else (1, 0)
+        if width < 2:
+            continue
+        score = (frequency, width)
+        if best_score is None or score > best_score:
+            best, best_score = delimiter, score
+    return best
+
+
+def _detect_markers(rows):
+    """returns the marker characters found at the end of otherwise numeric cells"""
+    found = ""
+    for char in MARKER_CHARS:
+        if any(cell.endswith(char) and NUMERIC.match(cell.rstrip(MARKER_CHARS)) for row in rows for cell in row):
+            found += char
+    return found
+
+
+def _remove(cell, markers):
+    for char in markers:
+        cell = cell.replace(char, "")
+    return cell
+
+
+def _is_data(row):
+    """a row is taken to be data if any of its cells is numeric"""
+    return any(NUMERIC.match(cell) for cell in row)
+
+
+def _narrowest_type(cells, types, max_error_rate):
+    """returns the name of the first type in TYPE_ORDER (then the other types) matching enough of the cells"""
+    if not cells:
+        return "universal"
+    names = [name for name in TYPE_ORDER if name in types]
+    names += sorted(name for name in types if name not in TYPE_ORDER and name != "universal")
+    allowed = int(len(cells) * max_error_rate)
+    for name in names:
+        pattern = types[name].pattern
+        if pattern is None:
+            continue
+        failures = 0
+        for cell in cells:
+            if not pattern.match(cell):
+                failures += 1
+                if failures > allowed:
+                    break
+        else:
+            return name
+    return "universal"
@@ -0,0 +1,52 @@
+""" Hooks for collecting timings and statistics from the reading of csv files """
+
+from collections import OrderedDict
+
+
+class Metrics:
+    """
+    Receives measurements as a CsvFile is read; pass an instance as CsvFile(metrics=...).
+    The methods here do nothing, subclasses override the ones they need,
+    e.g. to forward the measurements to a monitoring system.
+    When a CsvFile has no metrics object nothing is measured at all
+    """
+    def on_stage(self, name, seconds, size=None, rows=None):
+        """
+        called as each stage of a read finishes
+        :param name: the name of the stage, e.g. "split_strip", or of the read mode for streamed reads
+         whose stages are interleaved ("iter_rows", "read_columns", "mmap", "parallel")
+        :param seconds: the wall time taken by the stage
+        :param size: the amount of input processed by the stage, in characters (or bytes for whole files)
+        :param rows: the number of rows processed by the stage
+        """
+
+    def on_read(self, stats):
+        """
+        called once a read has finished
+        :param stats: a dictionary holding the "mode" of the read, the "path" of the file,
+         the total "seconds", the name of the "tokenizer" used, the number of data "rows" and "cells"
+         converted, and the "null_count" and "error_count" of each field as dictionaries keyed on field name.
+         "cache" maps the name of each memoized field (see csvReader2.ConversionCache) to the "hits", "misses"
+         and "hit_rate" of its cache during the read; reads sharing a Schema at the same time share its caches,
+         so their counts are mixed
+        """
+
+
+class MetricsRecorder(Metrics):
+    """Keeps every measurement it receives, so they can be inspected or exported after reading"""
+    def __init__(self):
+        self.stages = []
+        self.reads = []
+
+    def on_stage(self, name, seconds, size=None, rows=None):
+        self.stages.append(OrderedDict([("name", name), ("seconds", seconds), ("size", size), ("rows", rows)]))
+
+    def on_read(self, stats):
+        self.reads.append(stats)
+
+    def stage_totals(self):
+        """returns an OrderedDict of the total time spent in each stage over all the reads recorded"""
+        totals = OrderedDict()
+        for stage in self.stages:
+            totals[stage["name"]] = totals.get(stage["name"], 0.0) + stage["seconds"]
+        return totals
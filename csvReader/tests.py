@@ -1,7 +1,32 @@
+import asyncio
+import bz2
+import datetime
+import gzip
+import json
+import lzma
+import os
+import tempfile
 import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from csvReader import csvReader as csv
 #TODO: test csvReader2
 from csvReader import csvReader2 as csv2
+from csvReader import columns
+from csvReader.cache import ParseCache
+from csvReader.index import load_index
+from csvReader.metrics import MetricsRecorder
+from csvReader import tokenizers
+from csvReader import inference
+from csvReader.inference import infer_schema
+from csvReader import grouping
+from csvReader.aggregate import aggregate
+from csvReader import aio
+from csvReader.writer import CsvWriter
+
+try:
+    import django
+except ImportError:
+    django = None
 
 
 class CsvReaderTestCase(unittest.TestCase):
@@ -108,6 +133,47 @@ class CsvReader2TestCase(unittest.TestCase):
         self.assertEquals(type(self.do_Field_convert("10","integer")), int)
         self.assertRaises(ValueError, lambda:self.do_Field_convert("-10.0","integer"))
 
+    def test_full_date(self):
+        full_date = self.meta.types["full_date"]
+        self.assertEqual(full_date.convert("31-01-1961"), datetime.date(1961, 1, 31))
+        self.assertIs(full_date.convert("31-01-1961"), full_date.convert("31-01-1961"))
+        self.assertFalse(full_date.check("1961-01-31"))
+        self.assertFalse(full_date.check("32-01-1961"))
+        self.assertRaises(ValueError, lambda: full_date.convert("30-02-1961"))
+
+    def test_full_date_file(self):
+        handle, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as data_file:
+            data_file.write("date, rain\n28-02-1961, 1.5\n29-02-1961, 2.0\n31-04-2000, 0.5\n")
+        try:
+            fields = csv2.fields([("date", "full_date"), ("rain", "float")])
+            csv_file = csv2.CsvFile(fields=fields, filepath=path)
+            csv_file.read_file()
+            self.assertEqual(csv_file.data, [[datetime.date(1961, 2, 28), 1.5], [None, 2.0], [None, 0.5]])
+            self.assertEqual(csv_file.error_count, [2, 0])
+            self.assertEqual(csv_file.read_columns(use_numpy=False).columns[0].to_list(),
+                             [datetime.date(1961, 2, 28), None, None])
+            self.assertEqual(csv_file.error_count, [2, 0])
+            csv_file.build_index(key="date")
+            day = datetime.date(1961, 2, 28)
+            self.assertEqual(load_index(path).blocks, [(day, day)])
+            self.assertEqual(csv2.CsvFile(fields=fields, filepath=path).read_key_range("date", day, day), [[day, 1.5]])
+        finally:
+            os.remove(path)
+            if os.path.exists(path + ".idx"):
+                os.remove(path + ".idx")
+
+    def test_compile_converter(self):
+        fields = csv2.fields([("a", "date"), ("b", "float"), ("c", "custom"), ("d", "universal")])
+        for field in fields:
+            field.activate_type(self.meta.types)
+        convert_row = csv2.compile_converter(fields, csv2.MetaData(empty_cell="$"))
+        null_count, error_count = [0]*4, [0]*4
+        self.assertEqual(convert_row(["1999", "-1.5", "1", "x", "extra"], null_count, error_count), [1999, -1.5, 1, "x"])
+        self.assertEqual(convert_row(["", "abc", "2", ""], null_count, error_count), [None, None, None, ""])
+        self.assertEqual(null_count, [1, 0, 0, 0])
+        self.assertEqual(error_count, [0, 1, 1, 0])
+
     def do_Field_check(self, to_check,type):
         field =csv2.Field("name",type)
         field.activate_type(self.meta.types)
@@ -117,6 +183,779 @@ class CsvReader2TestCase(unittest.TestCase):
         field =csv2.Field("name",type)
         field.activate_type(self.meta.types)
         return field.type.convert(to_convert)
-        
+
+
+WEATHER_TEXT = """
+yyyy, mm, tmax, tmin, af, rain, sun
+1961, 1, 6.3, 1.1, 9, 83.4, ---
+1961, 2, 9.2*, 3.9, 0, 45.6, 71.2#
+1961, 3, ---, 4.1, 1, 21.5, 120.0
+1961, 4, 13.1, 5.8, 0, , 155.3
+
+"""
+
+
+def after_january(month):
+    return month > 1
+
+
+class CsvFileTestCase(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as data_file:
+            data_file.write(WEATHER_TEXT)
+        self.metadata = csv2.MetaData(empty_cell="$", markers="*#")
+
+    def tearDown(self):
+        os.remove(self.path)
+        if os.path.exists(self.path + ".idx"):
+            os.remove(self.path + ".idx")
+
+    def make_csv(self, **kwargs):
+        return csv2.CsvFile(metadata=self.metadata, fields=csv2.fields([
+            ("yyyy", "date"), ("mm", "integer"), ("tmax", "float", "degC"), ("tmin", "float", "degC"),
+            ("af", "integer", "days"), ("rain", "float", "mm"), ("sun", "float", "hours")
+        ]), filepath=self.path, **kwargs)
+
+    def read_whole(self):
+        csv_file = self.make_csv()
+        csv_file.read_file()
+        return csv_file
+
+    def test_read_file(self):
+        csv_file = self.read_whole()
+        self.assertEqual(len(csv_file.data), 4)
+        self.assertEqual(csv_file.data[1], [1961, 2, 9.2, 3.9, 0, 45.6, 71.2])
+        self.assertEqual(csv_file.null_count, [0, 0, 0, 0, 0, 1, 0])
+        self.assertEqual(csv_file.error_count, [0, 0, 1, 0, 0, 0, 1])
+
+    def test_iter_rows(self):
+        expected = self.read_whole()
+        csv_file = self.make_csv()
+        for block_size in (1, 7, 4096):
+            self.assertEqual(list(csv_file.iter_rows(block_size)), expected.data)
+            self.assertEqual(csv_file.null_count, expected.null_count)
+            self.assertEqual(csv_file.error_count, expected.error_count)
+
+    def test_iter_batches(self):
+        csv_file = self.make_csv()
+        batches = list(csv_file.iter_batches(3))
+        self.assertEqual([len(batch) for batch in batches], [3, 1])
+        self.assertEqual(batches[0] + batches[1], self.read_whole().data)
+
+    def test_read_columns(self):
+        expected = self.read_whole()
+        csv_file = self.make_csv()
+        columns = csv_file.read_columns(use_numpy=False)
+        self.assertEqual(columns.length, 4)
+        self.assertEqual(columns.headings, ["yyyy", "mm", "tmax", "tmin", "af", "rain", "sun"])
+        self.assertEqual(columns["tmax"].units, "degC")
+        self.assertEqual(columns["yyyy"].values.typecode, "q")
+        self.assertEqual(columns["tmax"].values.typecode, "d")
+        self.assertEqual(columns["rain"].to_list(), [83.4, 45.6, 21.5, None])
+        self.assertEqual(list(columns.rows()), expected.data)
+        self.assertEqual(csv_file.null_count, expected.null_count)
+        self.assertEqual(csv_file.error_count, expected.error_count)
+
+    @unittest.skipIf(columns.numpy is None, "numpy is not installed")
+    def test_read_columns_numpy(self):
+        data = self.make_csv().read_columns(use_numpy=True)
+        self.assertEqual(data["mm"].values.tolist(), [1, 2, 3, 4])
+        self.assertEqual(data["sun"].valid.tolist(), [False, True, True, True])
+
+    def test_records(self):
+        expected = self.read_whole().data
+        csv_file = self.make_csv(records=True)
+        csv_file.read_file()
+        self.assertEqual([list(row) for row in csv_file.data], expected)
+        row = csv_file.data[1]
+        self.assertEqual((row.yyyy, row.mm, row.tmax, row.sun), (1961, 2, 9.2, 71.2))
+        self.assertIsNone(csv_file.data[2].tmax)
+        with self.assertRaises(AttributeError):
+            row.tmax = 0
+        self.assertEqual(list(csv_file.iter_rows()), csv_file.data)
+        parallel = self.make_csv(records=True)
+        parallel.read_file(workers=2, chunk_size=2)
+        self.assertEqual(parallel.data, csv_file.data)
+        self.assertIs(type(parallel.data[0]), csv_file.record)
+        directory = tempfile.mkdtemp()
+        try:
+            ParseCache(directory=directory).read_file(self.make_csv(records=True))
+            cached = self.make_csv(records=True)
+            ParseCache(directory=directory).read_file(cached)
+            self.assertEqual(cached.data, csv_file.data)
+            self.assertEqual(cached.data[0].yyyy, 1961)
+        finally:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+    def test_schema(self):
+        expected = self.read_whole()
+        fields = csv2.fields([("yyyy", "date"), ("mm", "integer"), ("tmax", "float", "degC"),
+                              ("tmin", "float", "degC"), ("af", "integer", "days"), ("rain", "float", "mm"),
+                              ("sun", "float", "hours")])
+        schema = csv2.Schema(self.metadata, fields)
+        self.assertIsNot(schema.fields[0], fields[0])
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(schema.read, [self.path] * 20))
+        for result in results:
+            self.assertEqual(result.data, expected.data)
+            self.assertEqual(result.null_count, expected.null_count)
+            self.assertEqual(result.error_count, expected.error_count)
+        self.assertIsNot(results[0].null_count, results[1].null_count)
+        csv_file = schema.csv_file(self.path)
+        self.assertIs(csv_file._convert, schema.converter)
+        csv_file.read_file()
+        self.assertEqual(csv_file.data, expected.data)
+        self.assertIsNot(csv2.CsvFile().metadata, csv2.CsvFile().metadata)
+
+    def test_compressed(self):
+        expected = self.read_whole()
+        for name, open_compressed in (("gzip", gzip.open), ("bz2", bz2.open), ("xz", lzma.open)):
+            handle, path = tempfile.mkstemp()
+            os.close(handle)
+            try:
+                with open_compressed(path, "wt") as data_file:
+                    data_file.write(WEATHER_TEXT)
+                self.assertEqual(csv2.compression(path), name)
+                csv_file = self.make_csv()
+                csv_file.filepath = path
+                for kwargs in ({}, {"use_mmap": True}, {"workers": 1}):
+                    csv_file.read_file(**kwargs)
+                    self.assertEqual(csv_file.data, expected.data)
+                    self.assertEqual(csv_file.error_count, expected.error_count)
+                self.assertEqual(list(csv_file.iter_rows(block_size=5)), expected.data)
+                self.assertRaises(ValueError, csv_file.read_new)
+            finally:
+                os.remove(path)
+        self.assertIsNone(csv2.compression(self.path))
+
+    def test_missing_heading_rows(self):
+        reads = (lambda csv_file: csv_file.read_file(), lambda csv_file: csv_file.read_file(use_mmap=True),
+                 lambda csv_file: csv_file.read_file(workers=1), lambda csv_file: list(csv_file.iter_rows()),
+                 lambda csv_file: csv_file.read_columns(), lambda csv_file: csv_file.read_rows(0, 5))
+        for text, error, unit_row in (("", "WrongDataHeadings", None), ("\n\n", "WrongDataHeadings", None),
+                                      ("yyyy, mm, tmax, tmin, af, rain, sun\n", "WrongDataUnits", 1)):
+            with open(self.path, "w") as data_file:
+                data_file.write(text)
+            self.metadata = csv2.MetaData(empty_cell="$", markers="*#", unit_row=unit_row, data_row=2 if unit_row else 1)
+            for read in reads:
+                with self.assertRaises(csv2.CsvReadError) as context:
+                    read(self.make_csv())
+                self.assertEqual(context.exception.value, error)
+                if os.path.exists(self.path + ".idx"):
+                    os.remove(self.path + ".idx")
+
+    def test_encoding(self):
+        text = "place, rain\nSaint-\xc9tienne, 1.5\n"
+        fields = csv2.fields([("place", "universal"), ("rain", "float")])
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            for open_file in (open, gzip.open):
+                with open_file(path, "wb") as data_file:
+                    data_file.write(text.encode("latin-1"))
+                csv_file = csv2.CsvFile(fields=fields, filepath=path, by_name=True)
+                for kwargs in ({}, {"use_mmap": True}, {"workers": 1}):
+                    csv_file.read_file(encoding="latin-1", **kwargs)
+                    self.assertEqual(csv_file.data, [["Saint-\xc9tienne", 1.5]])
+                self.assertRaises(UnicodeDecodeError, csv_file.read_file)
+        finally:
+            os.remove(path)
+
+    def test_read_file_mmap(self):
+        expected = self.read_whole()
+        csv_file = self.make_csv()
+        csv_file.read_file(use_mmap=True)
+        self.assertEqual(csv_file.data, expected.data)
+        self.assertEqual(csv_file.null_count, expected.null_count)
+        self.assertEqual(csv_file.error_count, expected.error_count)
+
+    def test_read_file_mmap_empty(self):
+        open(self.path, "w").close()
+        csv_file = self.make_csv()
+        csv_file.metadata.heading_row = None
+        csv_file.metadata.data_row = 0
+        csv_file.read_file(use_mmap=True)
+        self.assertEqual(csv_file.data, [])
+
+    def test_read_file_parallel(self):
+        expected = self.read_whole()
+        for chunk_size in (1, 2, 100):
+            csv_file = self.make_csv()
+            csv_file.read_file(workers=2, chunk_size=chunk_size)
+            self.assertEqual(csv_file.data, expected.data)
+            self.assertEqual(csv_file.null_count, expected.null_count)
+            self.assertEqual(csv_file.error_count, expected.error_count)
+
+    def test_read_directory(self):
+        expected = self.read_whole()
+        directory = os.path.dirname(self.path)
+        name = os.path.basename(self.path)
+        handle, bad_path = tempfile.mkstemp(suffix=".csv", dir=directory)
+        with os.fdopen(handle, "w") as data_file:
+            data_file.write("year, month\n1961, 1\n")
+        try:
+            results = csv2.read_directory(directory, self.make_csv().fields, pattern=name, workers=2,
+                                          metadata=self.metadata)
+            self.assertEqual(list(results), [name])
+            self.assertTrue(results[name].ok)
+            self.assertEqual(results[name].data, expected.data)
+            self.assertEqual(results[name].null_count, expected.null_count)
+            self.assertEqual(results[name].error_count, expected.error_count)
+
+            bad_name = os.path.basename(bad_path)
+            results = csv2.read_directory(directory, self.make_csv().fields, pattern=bad_name)
+            self.assertFalse(results[bad_name].ok)
+            self.assertEqual(results[bad_name].error.value, "WrongDataHeadings")
+
+            self.make_csv().build_index()
+            results = csv2.read_directory(directory, self.make_csv().fields, pattern=name + "*",
+                                          metadata=self.metadata)
+            self.assertEqual(list(results), [name])
+        finally:
+            os.remove(bad_path)
+
+    def test_parse_cache(self):
+        expected = self.read_whole()
+        directory = tempfile.mkdtemp()
+        try:
+            cache = ParseCache(directory=directory)
+            for _ in range(2):
+                csv_file = self.make_csv()
+                self.assertEqual(cache.read_file(csv_file), expected.data)
+                self.assertEqual(csv_file.null_count, expected.null_count)
+                csv_file.data[0][0] = None
+            self.assertEqual(cache.stats()["hits"], 1)
+            self.assertEqual(cache.stats()["misses"], 1)
+
+            disk_cache = ParseCache(directory=directory)
+            self.assertEqual(disk_cache.read_file(self.make_csv()), expected.data)
+            self.assertEqual(disk_cache.stats()["disk_hits"], 1)
+
+            small_cache = ParseCache(max_bytes=1)
+            small_cache.read_file(self.make_csv())
+            self.assertEqual(small_cache.stats()["entries"], 0)
+
+            csv_file = self.make_csv()
+            csv_file.fields[1].units = "months"
+            cache.read_file(csv_file)
+            self.assertEqual(cache.stats()["misses"], 2)
+
+            self.assertEqual(cache.read_file(self.make_csv(), where={"mm": after_january}), expected.data[1:])
+            self.assertEqual(cache.read_file(self.make_csv()), expected.data)
+            cache.read_file(self.make_csv(), use_mmap=True, encoding="latin-1")
+            self.assertEqual(cache.stats()["misses"], 3)
+
+            quarantine = csv2.Quarantine()
+            self.assertEqual(cache.read_file(self.make_csv(quarantine=quarantine)), expected.data)
+            self.assertEqual(quarantine.count, 2)
+            with open(self.path, "w") as data_file:
+                data_file.write(WEATHER_TEXT.rstrip() + "\n1961, 5, 15.2\n")
+            cache.read_file(self.make_csv(quarantine=quarantine))
+            self.assertEqual(quarantine.count, 5)
+            self.assertRaises(csv2.CsvReadError, lambda: cache.read_file(self.make_csv()))
+            self.assertRaises(csv2.CsvReadError, lambda: cache.read_file(
+                self.make_csv(error_budget=csv2.ErrorBudget(max_rows=1))))
+            self.assertEqual(cache.stats()["misses"], 4)
+        finally:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+    def test_metrics(self):
+        metrics = MetricsRecorder()
+        csv_file = self.make_csv(metrics=metrics)
+        csv_file.read_file()
+        self.assertEqual([stage["name"] for stage in metrics.stages],
+                         ["open", "remove_markers", "split_strip", "check_headings", "check_type", "trim"])
+        self.assertEqual(metrics.stages[-1]["rows"], 4)
+        stats = metrics.reads[0]
+        self.assertEqual((stats["mode"], stats["rows"], stats["cells"]), ("read_file", 4, 28))
+        self.assertEqual(stats["null_count"]["rain"], 1)
+        self.assertEqual(stats["error_count"]["tmax"], 1)
+
+        list(csv_file.iter_rows())
+        csv_file.read_columns()
+        self.assertEqual([stats["mode"] for stats in metrics.reads], ["read_file", "iter_rows", "read_columns"])
+        self.assertEqual(metrics.stages[-1]["size"], os.path.getsize(self.path))
+
+    def test_memoize(self):
+        expected = self.read_whole()
+        metrics = MetricsRecorder()
+        csv_file = self.make_csv(metrics=metrics, memoize={"yyyy": 8, "mm": 2, "tmax": 8})
+        csv_file.read_file()
+        self.assertEqual(csv_file.data, expected.data)
+        self.assertIs(csv_file.data[0][0], csv_file.data[3][0])
+        cache = metrics.reads[0]["cache"]
+        self.assertEqual((cache["yyyy"]["hits"], cache["yyyy"]["misses"], cache["yyyy"]["hit_rate"]), (3, 1, 0.75))
+        self.assertEqual((cache["mm"]["misses"], cache["tmax"]["misses"]), (4, 3))
+        self.assertEqual(csv_file.schema.caches["mm"].evictions, 2)
+        self.assertEqual(csv_file.error_count, expected.error_count)
+        csv_file.read_file(where={"mm": after_january})
+        self.assertEqual(csv_file.data, expected.data[1:])
+        self.assertEqual(metrics.reads[1]["cache"]["yyyy"]["hit_rate"], 1.0)
+        self.assertEqual(csv_file.read_columns(use_numpy=False).columns[0].to_list(), [1961]*4)
+        csv_file.read_file(workers=2, chunk_size=2)
+        self.assertEqual(csv_file.data, expected.data)
+        self.assertEqual(metrics.reads[-1]["cache"]["yyyy"]["hits"], 2)
+        self.assertRaises(ValueError, lambda: self.make_csv(memoize=["year"]))
+
+    def test_index(self):
+        expected = self.read_whole().data
+        index = self.make_csv().build_index(every=3, key="mm")
+        self.assertEqual((index.rows, len(index.offsets), index.blocks), (4, 2, [(1, 3), (4, 4)]))
+        with open(self.path + ".idx") as index_file:
+            self.assertEqual(json.load(index_file)["blocks"], [[1, 3], [4, 4]])
+        self.assertEqual(load_index(self.path).blocks, [(1, 3), (4, 4)])
+        csv_file = self.make_csv()
+        for start, stop in ((0, 4), (1, 3), (3, 10), (2, 2)):
+            self.assertEqual(csv_file.read_rows(start, stop), expected[start:stop])
+        self.assertEqual(csv_file.read_rows(2, 4), expected[2:4])
+        self.assertEqual((csv_file.null_count, csv_file.error_count), ([0, 0, 0, 0, 0, 1, 0], [0, 0, 1, 0, 0, 0, 0]))
+        self.assertEqual(csv_file.read_key_range("mm", 2, 3), expected[1:3])
+        self.assertEqual(csv_file.read_key_range("mm", 4, 9, where={"sun": lambda sun: sun > 200}), [])
+        self.assertEqual(csv_file.read_key_range("yyyy", 1961, 1961), expected)
+        self.assertEqual(csv_file._row_index.key, "yyyy")
+
+        with open(self.path, "w") as data_file:
+            data_file.write(WEATHER_TEXT.rstrip() + "\n1961, 5, 15.2, 8.0, 0, 40.2, 190.5\n")
+        self.assertEqual(csv_file.read_rows(4, 5), [[1961, 5, 15.2, 8.0, 0, 40.2, 190.5]])
+        by_name = csv2.CsvFile(metadata=self.metadata, fields=csv2.fields([("rain", "float"), ("mm", "integer")]),
+                               filepath=self.path, by_name=True)
+        self.assertEqual(by_name.read_key_range("mm", 4, 5), [[None, 4], [40.2, 5]])
+        quoted = csv2.CsvFile(metadata=csv2.MetaData(quotechar='"'), filepath=self.path)
+        self.assertRaises(ValueError, quoted.build_index)
+
+        for garbage in (b"\x80\x04not json", b"[1, 2]", b'{"path": 1}'):
+            with open(self.path + ".idx", "wb") as index_file:
+                index_file.write(garbage)
+            self.assertIsNone(load_index(self.path))
+        self.assertEqual(self.make_csv().read_rows(4, 5), [[1961, 5, 15.2, 8.0, 0, 40.2, 190.5]])
+
+    def test_read_new(self):
+        expected = self.read_whole()
+        lines = WEATHER_TEXT.strip().split("\n")
+        with open(self.path, "w") as data_file:
+            data_file.write("\n" + "\n".join(lines[:3]) + "\n" + lines[3][:8])
+        csv_file = self.make_csv()
+        self.assertEqual(csv_file.read_new(), expected.data[:2])
+        self.assertEqual(csv_file.read_new(), [])
+        with open(self.path, "a") as data_file:
+            data_file.write(lines[3][8:] + "\n" + lines[4])
+        self.assertEqual(csv_file.read_new(), expected.data[2:3])
+        csv_file.fields[0].name = "year"  # the headings are not checked again
+        self.assertEqual(csv_file.read_new(final=True), expected.data[3:])
+        self.assertEqual(csv_file.data, expected.data)
+        self.assertEqual(csv_file.null_count, expected.null_count)
+        self.assertEqual(csv_file.error_count, expected.error_count)
+
+        with open(self.path, "w") as data_file:
+            data_file.write("yyyy\n")
+        self.assertRaises(csv2.CsvReadError, csv_file.read_new)
+
+    def test_follow(self):
+        csv_file = self.make_csv()
+        batches = list(csv_file.follow(interval=0.01, idle_timeout=0.02))
+        self.assertEqual(batches, [self.read_whole().data])
+        with open(self.path, "w") as data_file:
+            data_file.write(WEATHER_TEXT.rstrip())
+        batches = list(self.make_csv().follow(interval=0.01, idle_timeout=0.02))
+        self.assertEqual(batches, [self.read_whole().data[:-1], self.read_whole().data[-1:]])
+
+    def test_where(self):
+        expected = self.read_whole().data[1:]
+        where = {"mm": after_january, "yyyy": lambda year: year >= 1961}
+        for kwargs in ({}, {"use_mmap": True}):
+            csv_file = self.make_csv()
+            csv_file.read_file(where=where, **kwargs)
+            self.assertEqual(csv_file.data, expected)
+            self.assertEqual(csv_file.null_count, [0, 0, 0, 0, 0, 1, 0])
+            self.assertEqual(csv_file.error_count, [0, 0, 1, 0, 0, 0, 0])
+        csv_file = self.make_csv()
+        csv_file.read_file(workers=2, chunk_size=2, where={"mm": after_january})
+        self.assertEqual(csv_file.data, expected)
+        self.assertEqual(csv_file.error_count, [0, 0, 1, 0, 0, 0, 0])
+        self.assertEqual(list(self.make_csv().iter_rows(where={"tmax": lambda tmax: tmax > 9})),
+                         [expected[0], expected[2]])
+        self.assertRaises(ValueError, lambda: self.make_csv().read_file(where={"day": after_january}))
+
+    def test_aggregate(self):
+        aggregates = {"tmax": ("mean", "tmax"), "rain": ("sum", "rain"), "af": ("sum", "af"),
+                      "sun": ("max", "sun"), "months": ("count", "tmin")}
+        groups, rejected = aggregate(self.make_csv(), aggregates, group_by="yyyy")
+        self.assertEqual(rejected, 0)
+        self.assertEqual(list(groups), [1961])
+        group = groups[1961]
+        self.assertEqual(group.rows, 4)
+        self.assertAlmostEqual(group.values["tmax"], (6.3 + 9.2 + 13.1) / 3)
+        self.assertAlmostEqual(group.values["rain"], 83.4 + 45.6 + 21.5)
+        self.assertEqual([group.values[name] for name in ("af", "sun", "months")], [10, 155.3, 4])
+        self.assertEqual(dict(group.null_count), {"tmax": 0, "rain": 1, "af": 0, "sun": 0, "months": 0})
+        self.assertEqual(dict(group.error_count), {"tmax": 1, "rain": 0, "af": 0, "sun": 1, "months": 0})
+
+        groups, rejected = aggregate(self.make_csv(), {"tmax": ("min", "tmax")}, where={"mm": after_january})
+        self.assertEqual(list(groups), [None])
+        self.assertEqual(groups[None].values["tmax"], 9.2)
+        self.assertEqual(groups[None].rows, 3)
+        groups, _ = aggregate(self.make_csv(), {"rain": ("sum", "rain")}, group_by=("yyyy", "mm"))
+        self.assertEqual(list(groups), [(1961, 1), (1961, 2), (1961, 3), (1961, 4)])
+        self.assertRaises(ValueError, lambda: aggregate(self.make_csv(), {"rain": ("median", "rain")}))
+
+    def test_async(self):
+        expected = self.read_whole()
+        loop = asyncio.new_event_loop()
+
+        async def collect(batches, stop=None):
+            collected = []
+            async for batch in batches:
+                collected.append(batch)
+                if len(collected) == stop:
+                    await batches.aclose()
+                    break
+            return collected
+
+        async def break_early():
+            async for batch in aio.BatchIterator(self.make_csv(), 1, max_batches=1):
+                break
+            # the abandoned reading thread must stop, or shutting down the executor waits for it forever
+            await asyncio.wait_for(asyncio.get_running_loop().shutdown_default_executor(), 5)
+            return batch
+
+        try:
+            csv_file = self.make_csv()
+            self.assertEqual(loop.run_until_complete(aio.aread_file(csv_file)), expected.data)
+            self.assertEqual(csv_file.error_count, expected.error_count)
+            batches = loop.run_until_complete(collect(aio.BatchIterator(self.make_csv(), 3, max_batches=1)))
+            self.assertEqual(batches, [expected.data[:3], expected.data[3:]])
+            batches = loop.run_until_complete(collect(aio.BatchIterator(self.make_csv(), 1, max_batches=1), 2))
+            self.assertEqual(batches, [expected.data[:1], expected.data[1:2]])
+            self.assertEqual(asyncio.run(break_early()), expected.data[:1])
+
+            missing = csv2.CsvFile(fields=self.make_csv().fields, filepath=self.path + ".missing")
+            results = loop.run_until_complete(aio.aread_files([self.make_csv(), missing, self.make_csv()], limit=2))
+            self.assertEqual([result.ok for result in results], [True, False, True])
+            self.assertEqual(results[2].data, expected.data)
+            self.assertIsInstance(results[1].error, csv2.CsvReadError)
+
+            with ProcessPoolExecutor(1) as executor:
+                csv_file = self.make_csv(records=True)
+                loop.run_until_complete(aio.aread_file(csv_file, executor))
+                self.assertEqual(csv_file.data[1].tmax, 9.2)
+                self.assertEqual(csv_file.null_count, expected.null_count)
+                with self.assertRaises(ValueError):
+                    loop.run_until_complete(aio.aread_file(self.make_csv(quarantine=csv2.Quarantine()), executor))
+        finally:
+            loop.close()
+
+    def test_writer(self):
+        expected = self.read_whole()
+        metadata = csv2.MetaData(empty_cell="$", unit_row=1, data_row=2)
+        fields = self.make_csv().fields
+        rows = expected.data + [[1961, 5, 1e-05, -0.0, 3, 2e+16, None]]
+        handle, path = tempfile.mkstemp(suffix=".csv")
+        os.close(handle)
+        try:
+            writer = CsvWriter(metadata, fields, check=True)
+            shared = csv2.fields([("yyyy", "date")])
+            CsvWriter(metadata, shared)
+            self.assertFalse(hasattr(shared[0], "type"))
+            for data in (rows, self.make_csv(records=True).iter_rows(), expected.read_columns()):
+                writer.write(path, data)
+                csv_file = csv2.CsvFile(metadata=metadata, fields=fields, filepath=path)
+                csv_file.read_file()
+                self.assertEqual(csv_file.data, rows[:len(csv_file.data)])
+                self.assertEqual(csv_file.error_count, [0]*7)
+            with open(path) as data_file:
+                self.assertEqual(data_file.readline(), "yyyy,mm,tmax,tmin,af,rain,sun\n")
+                self.assertEqual(data_file.readline(), ",,degC,degC,days,mm,hours\n")
+            self.assertEqual(csv_file.null_count, [0, 0, 1, 0, 0, 1, 1])
+            self.assertRaises(ValueError, lambda: writer.write(path, [[1961, 1.5, 0, 0, 0, 0, 0]]))
+            self.assertRaises(ValueError, lambda: writer.write(path, [[float("nan")]*7]))
+
+            text_fields = csv2.fields([("station", "universal"), ("yyyy", "date")])
+            quoted = csv2.MetaData(quotechar='"')
+            CsvWriter(quoted, text_fields).write(path, [['Oxford, "Radcliffe"', 1961]])
+            csv_file = csv2.CsvFile(metadata=quoted, fields=text_fields, filepath=path)
+            csv_file.read_file()
+            self.assertEqual(csv_file.data, [['Oxford, "Radcliffe"', 1961]])
+            self.assertRaises(ValueError, lambda: CsvWriter(csv2.MetaData(), text_fields).write(path, [["a,b", 1]]))
+        finally:
+            os.remove(path)
+
+    def test_bad_rows(self):
+        with open(self.path, "w") as data_file:
+            data_file.write(WEATHER_TEXT.rstrip() + "\n1961, 5, 15.2\n1961, 6, 18.0, 9.1, 0, 40.2, 190.5\n")
+        with self.assertRaises(csv2.CsvReadError) as context:
+            self.make_csv().read_file()
+        self.assertEqual(context.exception.value, "ShortRow")
+        self.assertEqual(context.exception.info["row"], 5)
+        with self.assertRaises(csv2.CsvReadError):
+            self.make_csv().read_file(workers=2, chunk_size=2)
+
+        quarantine = csv2.Quarantine(max_rows=2)
+        for read in (lambda csv_file: csv_file.read_file() or csv_file.data, lambda csv_file: list(csv_file.iter_rows()),
+                     lambda csv_file: csv_file.read_columns(), lambda csv_file: csv_file.read_file(use_mmap=True)
+                     or csv_file.data, lambda csv_file: csv_file.read_new(final=True)):
+            quarantine.clear()
+            csv_file = self.make_csv(quarantine=quarantine)
+            self.assertEqual(len(read(csv_file)), 5)
+            self.assertEqual(csv_file.error_count, [0, 0, 1, 0, 0, 0, 1])
+            self.assertEqual(quarantine.count, 3)
+            self.assertEqual(quarantine.rows, [(1, "1961, 1, 6.3, 1.1, 9, 83.4, ---", "unreadable cells: sun"),
+                                               (3, "1961, 3, ---, 4.1, 1, 21.5, 120.0", "unreadable cells: tmax")])
+
+        by_name = csv2.CsvFile(metadata=self.metadata, fields=csv2.fields([("tmax", "float")]), filepath=self.path,
+                               by_name=True, quarantine=quarantine)
+        quarantine.clear()
+        by_name.read_file()
+        self.assertEqual(quarantine.rows[0], (3, "1961, 3, ---, 4.1, 1, 21.5, 120.0", "unreadable cells: tmax"))
+
+        csv_file = self.make_csv(error_budget=csv2.ErrorBudget(max_rows=1))
+        with self.assertRaises(csv2.CsvReadError) as context:
+            csv_file.read_file()
+        self.assertEqual(context.exception.value, "ErrorBudgetExceeded")
+        self.assertEqual(context.exception.info["row"], 3)
+        csv_file = self.make_csv(error_budget=csv2.ErrorBudget(max_rate=0.25, sample_rows=4))
+        with self.assertRaises(csv2.CsvReadError) as context:
+            csv_file.read_file()
+        self.assertEqual(context.exception.value, "ErrorBudgetExceeded")
+        csv_file = self.make_csv(error_budget=csv2.ErrorBudget(max_rate=0.5, sample_rows=6),
+                                 quarantine=csv2.Quarantine())
+        csv_file.read_file()
+        self.assertEqual(len(csv_file.data), 5)
+        csv_file = self.make_csv(error_budget=csv2.ErrorBudget(max_rows=10))
+        for read in (lambda: csv_file.read_file() or csv_file.data, lambda: list(csv_file.iter_rows()),
+                     lambda: csv_file.read_file(use_mmap=True) or csv_file.data):
+            self.assertEqual(len(read()), 5)
+        csv_file = self.make_csv(error_budget=csv2.ErrorBudget(max_rows=2))
+        with self.assertRaises(csv2.CsvReadError) as context:
+            csv_file.read_file()
+        self.assertEqual((context.exception.info["row"], context.exception.info["reason"]),
+                         (5, "short row: 3 of 7 cells"))
+
+    def test_bad_rows_default_metadata(self):
+        with open(self.path, "w") as data_file:
+            data_file.write("yyyy,mm,tmax,tmin,af,rain,sun\n" + "x,y,z,w,v,u,t\n"*1000)
+        csv_file = csv2.CsvFile(filepath=self.path, error_budget=csv2.ErrorBudget(max_rows=0))
+        with self.assertRaises(csv2.CsvReadError) as context:
+            csv_file.read_file()
+        self.assertEqual((context.exception.value, context.exception.info["row"]), ("ErrorBudgetExceeded", 1))
+        quarantine = csv2.Quarantine()
+        csv2.CsvFile(filepath=self.path, quarantine=quarantine).read_file()
+        self.assertEqual(quarantine.count, 1000)
+        self.assertEqual(quarantine.rows[0][1:], ("x,y,z,w,v,u,t", "unreadable cells: yyyy, mm, tmax, tmin, af, rain, sun"))
+
+    def test_by_name(self):
+        fields = csv2.fields([("sun", "float", "hours"), ("yyyy", "date"), ("tmax", "float", "degC")])
+        expected = [[None, 1961, 6.3], [71.2, 1961, 9.2], [120.0, 1961, None], [155.3, 1961, 13.1]]
+        csv_file = csv2.CsvFile(metadata=self.metadata, fields=fields, filepath=self.path, by_name=True)
+        for kwargs in ({}, {"use_mmap": True}, {"workers": 2, "chunk_size": 2}):
+            csv_file.read_file(**kwargs)
+            self.assertEqual(csv_file.data, expected)
+            self.assertEqual(csv_file.error_count, [1, 0, 1])
+        self.assertEqual(csv_file.columns, (6, 0, 2))
+        self.assertEqual(list(csv_file.iter_rows()), expected)
+        self.assertEqual(csv_file.read_columns()["sun"].to_list(), [None, 71.2, 120.0, 155.3])
+        csv_file.reset_follow()
+        self.assertEqual(csv_file.read_new(final=True), expected)
+
+        quoted = csv2.MetaData(markers="*#", quotechar='"')
+        csv_file = csv2.CsvFile(metadata=quoted, fields=fields, filepath=self.path, by_name=True)
+        csv_file.read_file()
+        self.assertEqual(csv_file.data, expected)
+
+        fields = csv2.fields([("yyyy", "date"), ("day", "integer")])
+        csv_file = csv2.CsvFile(metadata=self.metadata, fields=fields, filepath=self.path, by_name=True)
+        with self.assertRaises(csv2.CsvReadError) as context:
+            csv_file.read_file()
+        self.assertEqual(context.exception.info["missing"], ["day"])
+
+        self.assertEqual(list(csv2._TextReader(WEATHER_TEXT)), WEATHER_TEXT.splitlines(keepends=True))
+        reader = csv2._TextReader(WEATHER_TEXT)
+        self.assertEqual((reader.read(5), next(reader), reader.read(), reader.read(5)),
+                         (WEATHER_TEXT[:5], WEATHER_TEXT[5:37], WEATHER_TEXT[37:], ""))
+
+    def test_iter_rows_wrong_headings(self):
+        csv_file = self.make_csv()
+        csv_file.fields[0].name = "year"
+        with self.assertRaises(csv2.CsvReadError):
+            next(csv_file.iter_rows())
+
+
+class TokenizerTestCase(unittest.TestCase):
+    def test_literal_text(self):
+        self.assertEqual(tokenizers.literal_text(csv2.re.compile(",")), ",")
+        self.assertEqual(tokenizers.literal_text(csv2.re.compile(r"\t")), "\t")
+        self.assertEqual(tokenizers.literal_text(csv2.re.compile(r"\|")), "|")
+        self.assertEqual(tokenizers.literal_text(csv2.re.compile(r"\s*,")), None)
+        self.assertEqual(tokenizers.literal_text(csv2.re.compile(r"[,;]")), None)
+
+    def test_make_tokenizer(self):
+        self.assertEqual(tokenizers.make_tokenizer(csv2.MetaData()).name, "split")
+        self.assertEqual(tokenizers.make_tokenizer(csv2.MetaData(cell_border=r"\s+")).name, "regex")
+        self.assertEqual(tokenizers.make_tokenizer(csv2.MetaData(quotechar='"')).name, "csv")
+        self.assertEqual(tokenizers.make_tokenizer(csv2.MetaData(tokenizer="regex")).name, "regex")
+        self.assertRaises(ValueError, lambda: tokenizers.make_tokenizer(csv2.MetaData(cell_border=r"\s+",
+                                                                                      tokenizer="split")))
+
+    def test_columns(self):
+        for name in ("regex", "split", "csv"):
+            tokenizer = tokenizers.make_tokenizer(csv2.MetaData(tokenizer=name), columns=(3, 0))
+            self.assertEqual(tokenizer.split_cells("a, b ,c, d , e,f"), ["d", "a"])
+            self.assertEqual(tokenizer.split_cells("a, b"), ["a"])
+
+    def test_quoted_cells(self):
+        handle, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as data_file:
+            data_file.write('name, note\n"Oxford, Radcliffe", "two\nlines"\nDurham, plain\n')
+        try:
+            csv_file = csv2.CsvFile(metadata=csv2.MetaData(quotechar='"'), filepath=path,
+                                    fields=csv2.fields([("name",), ("note",)]))
+            expected = [["Oxford, Radcliffe", "two\nlines"], ["Durham", "plain"]]
+            self.assertEqual(list(csv_file.iter_rows()), expected)
+            csv_file.read_file()
+            self.assertEqual(csv_file.data, expected)
+            self.assertRaises(ValueError, lambda: csv_file.read_file(use_mmap=True))
+        finally:
+            os.remove(path)
+
+
+class GroupingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.fields = csv2.fields([("yyyy", "date"), ("mm", "integer"), ("rain", "float")])
+        self.data = [[1961, 1, 2.0], [1962, 1, 3.0], [1961, 2, None], [None, 3, 1.0], [1990, 1, 0.5], [1961, 1, 4.0]]
+
+    def test_group_by(self):
+        groups, rejected = grouping.group_by(self.data, "yyyy", self.fields)
+        self.assertEqual(rejected, 1)
+        self.assertEqual(groups[1961], [[1961, 1, 2.0], [1961, 2, None], [1961, 1, 4.0]])
+        groups, rejected = grouping.group_by(self.data, (0, 1))
+        self.assertEqual(sorted(groups), [(1961, 1), (1961, 2), (1962, 1), (1990, 1)])
+        self.assertEqual(len(groups[(1961, 1)]), 2)
+        groups, rejected = grouping.group_by(self.data, ("yyyy", "rain"), self.fields)
+        self.assertEqual(rejected, 2)
+        self.assertRaises(ValueError, lambda: grouping.group_by(self.data, "day", self.fields))
+
+    def test_sorted_index(self):
+        index = grouping.SortedIndex(self.data, "yyyy", self.fields)
+        self.assertEqual((len(index), index.rejected), (5, 1))
+        self.assertEqual(index.between(1961, 1962), [self.data[0], self.data[2], self.data[5], self.data[1]])
+        self.assertEqual([row[0] for row in index.between(1961, 1990)], [1961, 1961, 1961, 1962, 1990])
+        self.assertEqual(index.between(1962, 1990, include_high=False), [self.data[1]])
+        self.assertEqual(index.equal(1990), [self.data[4]])
+        self.assertEqual(index.count(low=1962), 2)
+        self.assertEqual(index.count(1990, 1961), 0)
+
+
+MET_OFFICE_TEXT = """Oxford
+Location: 450900E 207200N, Lat 51.761 Lon -1.262, 63 metres amsl
+Estimated data is marked with a * after the value.
+   yyyy  mm   tmax    tmin      af    rain     sun
+              degC    degC    days      mm   hours
+   1853   1    8.4     2.7       4    62.8     ---
+   1853   2    3.2    -1.8      19    29.3     ---
+   2019   4   15.3*    4.8       0    40.0*  175.4*
+"""
+
+
+class InferenceTestCase(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def infer(self, text, **kwargs):
+        with open(self.path, "w") as data_file:
+            data_file.write(text)
+        return infer_schema(self.path, **kwargs)
+
+    def test_infer_met_office(self):
+        fields, metadata = self.infer(MET_OFFICE_TEXT)
+        self.assertEqual([(field.name, field.type_name, field.units) for field in fields], [
+            ("yyyy", "date", ""), ("mm", "integer", ""), ("tmax", "float", "degC"), ("tmin", "float", "degC"),
+            ("af", "integer", "days"), ("rain", "float", "mm"), ("sun", "float", "hours")])
+        self.assertEqual((metadata.heading_row, metadata.unit_row, metadata.data_row), (3, None, 5))
+        self.assertEqual(metadata.markers, "*")
+        csv_file = csv2.CsvFile(metadata=metadata, fields=fields, filepath=self.path)
+        csv_file.read_file()
+        self.assertEqual(csv_file.data[2], [2019, 4, 15.3, 4.8, 0, 40.0, 175.4])
+
+    def test_infer_comma_reservoir(self):
+        text = "station; yyyy; rain\n; ; mm\n" + "".join("x; {}; {}\n".format(1900 + i, i) for i in range(50))
+        text += "".join("x; {}; {}.5\n".format(1950 + i, i) for i in range(50))
+        self.assertEqual(self.infer(text, sample_rows=10)[0][2].type_name, "integer")
+        fields, metadata = self.infer(text, sample_rows=10, reservoir=True)
+        self.assertEqual(metadata.cell_border.pattern, ";")
+        self.assertEqual((metadata.heading_row, metadata.unit_row, metadata.data_row), (0, 1, 2))
+        self.assertEqual([field.type_name for field in fields], ["universal", "date", "float"])
+        self.assertEqual(fields[2].units, "mm")
+
+    def test_infer_fixed_width(self):
+        text = "   yyyy  mm   tmax\n   1853   1    8.4\n   1853   2    3.2\n   1853   3   10.1\n"
+        fields, metadata = self.infer(text)
+        self.assertEqual(metadata.cell_border.pattern, r"\s+")
+        self.assertEqual([field.name for field in fields], ["yyyy", "mm", "tmax"])
+        self.assertEqual(inference._detect_delimiter(["10,20,30", "11,21,31"]), ",")
+
+    def test_infer_pipes(self):
+        fields, metadata = self.infer("yyyy|rain\n1961|83.4\n1962|45.6\n")
+        self.assertEqual(metadata.cell_border.pattern, r"\|")
+        self.assertEqual([(field.name, field.type_name) for field in fields], [("yyyy", "date"), ("rain", "float")])
+        csv_file = csv2.CsvFile(metadata=metadata, fields=fields, filepath=self.path)
+        csv_file.read_file()
+        self.assertEqual(csv_file.data, [[1961, 83.4], [1962, 45.6]])
+
+
+@unittest.skipIf(django is None, "django is not installed")
+class DjangoLoaderTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from django.conf import settings
+        if not settings.configured:
+            settings.configure(INSTALLED_APPS=["csvReader"],
+                               DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}})
+            django.setup()
+        from django.db import connection, models
+
+        class Weather(models.Model):
+            yyyy = models.IntegerField()
+            month = models.IntegerField()
+            tmax = models.FloatField(null=True)
+
+            class Meta:
+                app_label = "csvReader"
+
+        cls.model = Weather
+        with connection.schema_editor() as editor:
+            editor.create_model(Weather)
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as data_file:
+            data_file.write("yyyy, mm, tmax, sun\n1961, 1, 6.3, 1\n1961, 2, ---, 2\n1961, 3, 8.0, 3\n")
+        self.csv_file = csv2.CsvFile(metadata=csv2.MetaData(), filepath=self.path, fields=csv2.fields([
+            ("yyyy", "date"), ("mm", "integer"), ("tmax", "float", "degC"), ("sun", "float", "hours")]))
+
+    def tearDown(self):
+        os.remove(self.path)
+        self.model.objects.all().delete()
+
+    def test_bulk_load(self):
+        from csvReader.django_loader import bulk_load
+        created = bulk_load(self.model, self.csv_file, field_map={"mm": "month", "sun": None}, batch_size=2)
+        self.assertEqual(created, 3)
+        rows = list(self.model.objects.order_by("month").values_list("yyyy", "month", "tmax"))
+        self.assertEqual(rows, [(1961, 1, 6.3), (1961, 2, None), (1961, 3, 8.0)])
+
+    def test_wrong_model_fields(self):
+        from csvReader.django_loader import ModelLoader
+        with self.assertRaises(csv2.CsvReadError):
+            ModelLoader(self.model, self.csv_file.fields)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,305 @@
+"""
+Tokenizers splitting the text of a csv file into rows and cells.
+
+A tokenizer may be given the indexes of the columns wanted, in which case each row is split only as far
+as the last of them and just those cells are stripped and returned, in the order given.
+
+The tokenizer for a file is chosen from its MetaData by make_tokenizer:
+ - "csv": the stdlib csv reader, used when a quotechar is given, so quoted cells may contain
+   the cell border and row border
+ - "split": str.split, used when the cell border is a literal string such as ","
+ - "regex": re.split, the fallback for cell borders which are real regular expressions
+"""
+
+import csv
+import io
+import re
+
+REGEX_SPECIAL = set(".^$*+?{}[]|()")
+ESCAPES = {"n": "\n", "r": "\r", "t": "\t", "f": "\f", "v": "\v"}
+
+
+class RawRow(list):
+    """the stripped cells of a row, with 'text' holding the row as it is in the file (see iter_rows)"""
+    __slots__ = ("text",)
+
+
+def raw_row(cells, text):
+    row = RawRow(cells)
+    row.text = text
+    return row
+
+
+def literal_text(pattern):
+    """
+    returns the literal string matched by a compiled regex, or None if the regex
+    can match anything other than one fixed string
+    """
+    if pattern.flags & (re.IGNORECASE | re.VERBOSE):
+        return None
+    text = pattern.pattern
+    literal = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "\\":
+            i += 1
+            if i == len(text):
+                return None
+            char = text[i]
+            if char.isalnum():
+                if char not in ESCAPES:
+                    return None
+                char = ESCAPES[char]
+        elif char in REGEX_SPECIAL:
+            return None
+        literal.append(char)
+        i += 1
+    return "".join(literal) or None
+
+
+class RegexTokenizer:
+    """Splits rows and cells with the row_border and cell_border regexes of the MetaData"""
+    name = "regex"
+    quoting = False  # true if a row border may appear inside a quoted cell, so rows cannot be split on their own
+
+    def __init__(self, metadata, columns=None):
+        self.row_border = metadata.row_border
+        self.cell_border = metadata.cell_border
+        self.markers = metadata.markers
+        self.columns = columns  # the indexes of the columns returned, or None for every column
+        if columns is not None:
+            if not columns:
+                raise ValueError("no columns given")
+            self.width = max(columns) + 1
+            self.split_cells = self._split_columns
+
+    def split_rows(self, text):
+        """splits text into a list of the text of each row"""
+        return self.row_border.split(text)
+
+    def split_cells(self, text):
+        """splits the stripped text of one row into a list of stripped cells"""
+        return [cell.strip() for cell in self.cell_border.split(text)]
+
+    def _split_columns(self, text):
+        """
+        split_cells for a tokenizer given columns: the row is split no further than the last column,
+        and only the cells of the columns are stripped. A row too short to hold every column gives
+        the cells it has, so it is still short
+        """
+        cells = self._split_raw(text, self.width)
+        if len(cells) < self.width:
+            return [cells[i].strip() for i in self.columns if i < len(cells)]
+        return [cells[i].strip() for i in self.columns]
+
+    def _split_raw(self, text, maxsplit):
+        return self.cell_border.split(text, maxsplit)
+
+    def split_text(self, text):
+        """splits the whole text of a file (with the markers removed) into a 2D list of stripped cells"""
+        return [self.split_cells(row.strip()) for row in self.split_rows(text.strip())]
+
+    def iter_raw_rows(self, data_file, block_size):
+        """
+        generator reading an open file in blocks of 'block_size' characters and
+        splitting them on the row border, yields the text of each row in turn.
+        A row border found at the very end of a block is kept back until the
+        next block is read, in case it continues into that block
+        """
+        row_border = self.row_border
+        tail = ""
+        while True:
+            block = data_file.read(block_size)
+            if not block:
+                break
+            text = tail + block
+            end = len(text)
+            start = 0
+            for match in row_border.finditer(text):
+                if match.end() == end:
+                    break
+                yield text[start:match.start()]
+                start = match.end()
+            tail = text[start:]
+        yield tail
+
+    def iter_rows(self, data_file, block_size, raw=False):
+        """
+        generator reading an open file incrementally, yielding a list of the stripped cells of each row.
+        Markers are removed, and blank rows at the beginning and end of the file are dropped in the same
+        way as stripping the whole text does in split_text
+        :param raw: if true each row is a RawRow, which also holds the text of the row as it is in the file
+        """
+        markers = self.markers
+        split_cells = self.split_cells
+        blank_rows = None  # the text of the blank rows since the last row containing data, None until there is one
+        for line in self.iter_raw_rows(data_file, block_size):
+            text = line
+            for char in markers:
+                text = text.replace(char, "")
+            text = text.strip()
+            if not text:
+                if blank_rows is not None:
+                    blank_rows.append(line)
+                continue
+            if blank_rows:
+                for blank in blank_rows:
+                    yield raw_row([""], blank) if raw else [""]
+            blank_rows = []
+            yield raw_row(split_cells(text), line) if raw else split_cells(text)
+
+
+class SplitTokenizer(RegexTokenizer):
+    """
+    Splits cells with str.split on a literal cell border, and rows on a literal row border
+    (reading a file line by line when the row border is a newline); rows are split with the regex otherwise
+    """
+    name = "split"
+
+    def __init__(self, metadata, columns=None):
+        super().__init__(metadata, columns)
+        self.cell_literal = literal_text(metadata.cell_border)
+        self.row_literal = literal_text(metadata.row_border)
+        if self.cell_literal is None:
+            raise ValueError("the split tokenizer needs a literal cell border, not " + repr(metadata.cell_border.pattern))
+
+    def split_rows(self, text):
+        if self.row_literal is None:
+            return super().split_rows(text)
+        return text.split(self.row_literal)
+
+    def split_cells(self, text):
+        return [cell.strip() for cell in text.split(self.cell_literal)]
+
+    def _split_raw(self, text, maxsplit):
+        return text.split(self.cell_literal, maxsplit)
+
+    def iter_raw_rows(self, data_file, block_size):
+        row_literal = self.row_literal
+        if row_literal is None:
+            for row in super().iter_raw_rows(data_file, block_size):
+                yield row
+        elif row_literal == "\n":
+            for line in data_file:
+                yield line[:-1] if line.endswith("\n") else line
+        else:
+            tail = ""
+            while True:
+                block = data_file.read(block_size)
+                if not block:
+                    break
+                rows = (tail + block).split(row_literal)
+                tail = rows.pop()
+                for row in rows:
+                    yield row
+            yield tail
+
+
+class CsvTokenizer(RegexTokenizer):
+    """
+    Uses the stdlib csv reader, so cells may be quoted with metadata.quotechar and contain the
+    cell border or newlines. Needs a single character cell border and newline row borders
+    """
+    name = "csv"
+    quoting = True
+
+    def __init__(self, metadata, columns=None):
+        super().__init__(metadata, columns)
+        self.delimiter = literal_text(metadata.cell_border)
+        if self.delimiter is None or len(self.delimiter) != 1:
+            raise ValueError("the csv tokenizer needs a single character cell border")
+        if literal_text(metadata.row_border) not in ("\n", "\r\n"):
+            raise ValueError("the csv tokenizer needs newline row borders")
+        self.quotechar = metadata.quotechar or '"'
+
+    def _reader(self, lines):
+        return csv.reader(lines, delimiter=self.delimiter, quotechar=self.quotechar, skipinitialspace=True)
+
+    def _clean(self, row):
+        """
+        removes markers from and strips each cell (of the columns, if given), returns None for a blank row
+        """
+        markers = self.markers
+        if len(row) < 2:
+            text = "".join(row)
+            for char in markers:
+                text = text.replace(char, "")
+            if not text.strip():
+                return None
+        columns = self.columns
+        if columns is not None:
+            row = [row[i] for i in columns if i < len(row)]
+        cells = []
+        for cell in row:
+            for char in markers:
+                cell = cell.replace(char, "")
+            cells.append(cell.strip())
+        return cells
+
+    def _split_columns(self, text):
+        # the csv reader always parses whole rows, the columns are picked out by _clean
+        return CsvTokenizer.split_cells(self, text)
+
+    def split_rows(self, text):
+        raise ValueError("quoted files cannot be split into rows without parsing the cells")
+
+    def split_cells(self, text):
+        return self._clean(next(self._reader([text]), [])) or [""]
+
+    def split_text(self, text):
+        return [self._clean(row) or [""] for row in self._reader(io.StringIO(text.strip()))]
+
+    def iter_raw_rows(self, data_file, block_size):
+        raise ValueError("quoted files cannot be split into rows without parsing the cells")
+
+    def iter_rows(self, data_file, block_size, raw=False):
+        lines = []  # the lines of the file read by the csv reader for the row it last returned
+
+        def read_lines():
+            for line in data_file:
+                lines.append(line)
+                yield line
+
+        blank_rows = None
+        for row in self._reader(read_lines() if raw else data_file):
+            line = "".join(lines).rstrip("\r\n")
+            del lines[:]
+            cells = self._clean(row)
+            if cells is None:
+                if blank_rows is not None:
+                    blank_rows.append(line)
+                continue
+            if blank_rows:
+                for blank in blank_rows:
+                    yield raw_row([""], blank) if raw else [""]
+            blank_rows = []
+            yield raw_row(cells, line) if raw else cells
+
+
+TOKENIZERS = {
+    RegexTokenizer.name: RegexTokenizer,
+    SplitTokenizer.name: SplitTokenizer,
+    CsvTokenizer.name: CsvTokenizer,
+}
+
+
+def make_tokenizer(metadata, columns=None):
+    """
+    returns the tokenizer named by metadata.tokenizer, or if that is None the fastest
+    tokenizer able to read files described by the metadata
+    :param columns: the indexes of the columns to split out of each row, or None for all of them
+    """
+    name = metadata.tokenizer
+    if name is None:
+        if metadata.quotechar is not None:
+            name = CsvTokenizer.name
+        elif literal_text(metadata.cell_border) is not None:
+            name = SplitTokenizer.name
+        else:
+            name = RegexTokenizer.name
+    try:
+        tokenizer = TOKENIZERS[name]
+    except KeyError:
+        raise ValueError(str(name) + " is not a valid tokenizer")
+    return tokenizer(metadata, columns)
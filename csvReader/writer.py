@@ -0,0 +1,246 @@
+"""
+Writing csv files described by a MetaData and a list of Fields, so they can be read back by CsvFile
+with the same description:
+
+    CsvWriter(metadata, fields).write(path, csv_file.data)
+"""
+
+import re
+from datetime import date
+from decimal import Decimal
+
+from .csvReader2 import Field, MetaData
+from .columns import Column, ColumnData
+from .tokenizers import literal_text
+
+BATCH_ROWS = 1000  # rows formatted before each write to the file
+
+
+class CsvWriter:
+    """
+    Writes the heading and unit rows of the fields, followed by rows of values formatted to match the
+    type of each field; None is written as the empty cell of the MetaData.
+    Cells which could not be read back unchanged (such as text containing the cell border when there is no
+    quotechar, text containing a marker, or an infinite float) raise a ValueError
+    """
+    def __init__(self, metadata=None, fields=None, empty_cell=None, check=False):
+        """
+        :param metadata: the MetaData of the file, its cell and row borders must be literal strings
+        :param fields: the list of Field objects describing the columns, they are copied (as by Schema)
+         so the Field objects given are not changed
+        :param empty_cell: the text written for None, by default an empty string if metadata.empty_cell
+         matches one, or else the literal text matched by metadata.empty_cell
+        :param check: if true every cell written is checked against the regex of its field's type,
+         a ValueError is raised for any which would be read back as an error
+        """
+        if metadata is None:
+            metadata = MetaData()
+        if fields is None:
+            raise ValueError("the fields of the file must be given")
+        first_row = min(row for row in (metadata.heading_row, metadata.unit_row, metadata.data_row)
+                        if row is not None)
+        if first_row != 0:
+            raise ValueError("the first row of the file must be the heading, unit or data row")
+        self.metadata = metadata
+        copies = []
+        for field in fields:
+            field = Field(field.name, field.type_name, field.units)
+            field.activate_type(metadata.types)
+            copies.append(field)
+        self.fields = fields = copies
+        self.num_fields = len(fields)
+        self.cell_border = literal_text(metadata.cell_border)
+        self.row_border = literal_text(metadata.row_border)
+        if self.cell_border is None or self.row_border is None:
+            raise ValueError("files can only be written with literal cell and row borders")
+        if empty_cell is None:
+            empty_cell = "" if metadata.empty_cell.match("") else literal_text(metadata.empty_cell)
+            if empty_cell is None:
+                raise ValueError("the text to write for empty cells must be given, as "
+                                 + repr(metadata.empty_cell.pattern) + " is not a literal string")
+        self.empty_cell = empty_cell
+        self.check = check
+        special = set(self.cell_border + self.row_border + metadata.markers + "\r\n")
+        if metadata.quotechar is not None:
+            special.add(metadata.quotechar)
+        self._special = re.compile("[" + re.escape("".join(sorted(special))) + r"]|^\s|\s$")
+        self._formatters = [self._formatter(field) for field in fields]
+        # rows of ints and floats only can mostly be written with str, see _format_rows
+        self._numeric = all(field.type.output_type in (int, float) for field in fields)
+
+    def write(self, path, rows):
+        """
+        writes a file holding the heading and unit rows followed by the rows given
+        :param path: the path of the file to write
+        :param rows: an iterable of rows (lists, tuples or records) holding a value for each field,
+         or a ColumnData (as returned by CsvFile.read_columns)
+        :return: the number of data rows written
+        """
+        with open(path, "w", newline="") as data_file:
+            self.write_header(data_file)
+            if isinstance(rows, ColumnData):
+                return self.write_columns(data_file, rows.columns)
+            return self.write_rows(data_file, rows)
+
+    def write_header(self, data_file):
+        """writes the rows before the data rows (the heading and unit rows) to an open file"""
+        metadata = self.metadata
+        lines = []
+        for i in range(metadata.data_row):
+            if i == metadata.heading_row:
+                lines.append(self._join_text([field.name for field in self.fields]))
+            elif i == metadata.unit_row:
+                lines.append(self._join_text([field.units for field in self.fields]))
+            else:
+                lines.append("")
+        data_file.write("".join(line + self.row_border for line in lines))
+
+    def write_rows(self, data_file, rows):
+        """
+        writes rows of values to an open file, in batches of BATCH_ROWS rows
+        :return: the number of rows written
+        """
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == BATCH_ROWS:
+                data_file.write(self._format_rows(batch))
+                count += len(batch)
+                batch = []
+        if batch:
+            data_file.write(self._format_rows(batch))
+            count += len(batch)
+        return count
+
+    def write_columns(self, data_file, columns):
+        """
+        writes columns of values (each a sequence with a value for every row, or a Column) to an open file;
+        the cells are formatted a column at a time
+        :return: the number of rows written
+        """
+        if len(columns) != self.num_fields:
+            raise ValueError("{} columns given for {} fields".format(len(columns), self.num_fields))
+        length = len(columns[0]) if columns else 0
+        if any(len(column) != length for column in columns):
+            raise ValueError("the columns are not all the same length")
+        texts = [self._format_column(column, j) for j, column in enumerate(columns)]
+        cell_border = self.cell_border
+        row_border = self.row_border
+        for start in range(0, length, BATCH_ROWS):
+            lines = zip(*[column[start:start + BATCH_ROWS] for column in texts])
+            data_file.write("".join([cell_border.join(line) + row_border for line in lines]))
+        return length
+
+    def _format_rows(self, rows):
+        """returns the text of some rows"""
+        cell_border = self.cell_border
+        row_border = self.row_border
+        num_fields = self.num_fields
+        formatters = self._formatters
+        empty_cell = self.empty_cell
+        fast = self._numeric and not self.check
+        lines = []
+        for row in rows:
+            if len(row) != num_fields:
+                raise ValueError("row {} does not have {} values".format(list(row), num_fields))
+            if fast:
+                # str gives the text read back for ints and most floats; floats which str writes
+                # in exponent form, inf and nan (and anything else containing an e or n) are formatted in full
+                cells = [empty_cell if value is None else value for value in row] if None in row else row
+                line = cell_border.join(map(str, cells))
+                if "e" not in line and "n" not in line:
+                    lines.append(line + row_border)
+                    continue
+            lines.append(cell_border.join([format_cell(value) for format_cell, value in zip(formatters, row)])
+                         + row_border)
+        return "".join(lines)
+
+    def _format_column(self, column, j):
+        """returns a list of the text of each cell of a column"""
+        format_cell = self._formatters[j]
+        if isinstance(column, Column):
+            values, valid = column.values, column.valid
+        else:
+            values, valid = column, None
+        if self.fields[j].type.output_type not in (int, float) or self.check:
+            if valid is not None:
+                values = column.to_list()
+            return [format_cell(value) for value in values]
+        texts = list(map(str, values))
+        if valid is not None:
+            for i in _invalid_positions(valid):
+                texts[i] = self.empty_cell
+        else:
+            for i in [i for i, value in enumerate(values) if value is None]:
+                texts[i] = self.empty_cell
+        joined = "\0".join(texts)
+        if "e" in joined or "n" in joined:
+            for i, text in enumerate(texts):
+                if "e" in text or "n" in text:
+                    texts[i] = format_cell(values[i] if valid is None or valid[i] else None)
+        return texts
+
+    def _formatter(self, field):
+        """returns a function giving the text of a value of the field"""
+        output_type = field.type.output_type
+        pattern = field.type.pattern if self.check else None
+        empty_cell = self.empty_cell
+        if output_type is float:
+            format_value = _format_float
+        elif output_type is int:
+            format_value = str
+        elif output_type is date:
+            format_value = _format_date
+        else:
+            format_value = self._format_text
+
+        def format_cell(value):
+            if value is None:
+                return empty_cell
+            text = format_value(value)
+            if pattern is not None and not pattern.match(text):
+                raise ValueError('"{}" does not match the type of field {}'.format(text, field.name))
+            return text
+
+        return format_cell
+
+    def _format_text(self, value):
+        """returns the text of a cell, quoted if it contains the cell border or newlines"""
+        text = str(value)
+        if not self._special.search(text):
+            return text
+        quotechar = self.metadata.quotechar
+        if quotechar is None or any(char in text for char in self.metadata.markers) or text != text.strip():
+            raise ValueError('"{}" cannot be written so that it reads back unchanged'.format(text))
+        return quotechar + text.replace(quotechar, quotechar * 2) + quotechar
+
+    def _join_text(self, cells):
+        return self.cell_border.join([self._format_text(cell) for cell in cells])
+
+
+def _invalid_positions(valid):
+    """returns the positions of the zeros in a validity mask"""
+    if not isinstance(valid, bytearray):
+        return [i for i, ok in enumerate(valid) if not ok]
+    positions = []
+    i = valid.find(0)
+    while i != -1:
+        positions.append(i)
+        i = valid.find(0, i + 1)
+    return positions
+
+
+def _format_date(value):
+    """returns the text of a date as read by the full_date type (dd-mm-yyyy)"""
+    return "{:02d}-{:02d}-{:04d}".format(value.day, value.month, value.year)
+
+
+def _format_float(value):
+    """returns the text of a float without an exponent, which the float type's regex would not match"""
+    text = repr(float(value))
+    if "e" in text:
+        text = format(Decimal(text), "f")
+    elif text in ("inf", "-inf", "nan"):
+        raise ValueError(text + " cannot be written as a float cell")
+    return text